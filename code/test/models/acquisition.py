@@ -0,0 +1,162 @@
+from utils.s7data import S7data
+from models.cip_data import CIPData
+from concurrent.futures import ThreadPoolExecutor
+from pylogix import PLC
+import asyncio, threading, time, warnings
+
+
+class Endpoint:
+    """一个采集端点的调度项：poll为阻塞的读取函数，period为周期(s)"""
+    def __init__(self, name, poll, period):
+        self.name = name
+        self.poll = poll
+        self.period = period
+        self.last_frame = None
+        self.cycles = 0
+        self.errors = 0
+        self.task = None
+
+
+class AcquisitionEngine:
+    """基于asyncio的多PLC采集引擎
+    单个事件循环驱动所有S7/CIP端点，snap7/pylogix的阻塞调用放入有界线程池执行，
+    每个端点按各自周期调度，所有帧使用同一时钟打时间戳，保证跨PLC信号在时间上对齐：
+    帧时刻取自调度时的公共时钟，并作为该帧全部样本的时间戳传给S7data.poll_group/CIPData.read_all。
+    """
+    def __init__(self, max_workers = 4, logger = None):
+        self.logger = logger
+        self.max_workers = max_workers
+        self.endpoints = []
+        self.executor = None
+        self.loop = None
+        self.thread = None
+        self.mono_base = time.monotonic()
+        self.wall_base = time.time()
+
+    def clock(self):
+        """公共时钟：以单调时钟计时、对齐到启动时的系统时间戳(s)"""
+        return self.wall_base + (time.monotonic() - self.mono_base)
+
+    def add_s7(self, s7data: S7data, name = ''):
+        """按组添加S7端点，每组的周期取组内frequency的最小值
+        s7data重新加载配置后自动同步：新增的组开始轮询，删除或不再可读的组停止，frequency变化的组按新周期调度
+        """
+        self.sync_s7(s7data, name)
+        s7data.add_reload_listener(lambda result: self.call_in_loop(self.sync_s7, s7data, name))
+
+    def sync_s7(self, s7data: S7data, name = ''):
+        """按s7data当前的读取计划增删端点并更新周期，事件循环运行时须在循环线程中调用"""
+        prefix = f'{name}#'
+        existing = {i.name: i for i in self.endpoints if i.name.startswith(prefix)}
+        wanted = {}
+        for group in list(s7data.groups.keys()):
+            plan = s7data.plans.get(group)
+            if plan != None and plan.requests:
+                wanted[prefix + group] = group
+        for endpoint_name, endpoint in existing.items():
+            if endpoint_name not in wanted:
+                self.endpoints.remove(endpoint)
+                if endpoint.task != None:
+                    endpoint.task.cancel()
+        for endpoint_name, group in wanted.items():
+            period = s7data.group_period(group)
+            endpoint = existing.get(endpoint_name)
+            if endpoint != None:
+                endpoint.period = period
+                continue
+            poll = lambda stamp, group=group: s7data.poll_group(group, stamp)
+            endpoint = Endpoint(endpoint_name, poll, period)
+            self.endpoints.append(endpoint)
+            if self.loop != None and self.loop.is_running():
+                endpoint.task = self.loop.create_task(self.run_endpoint(endpoint))
+
+    def call_in_loop(self, func, *args):
+        """事件循环运行时把func交给循环线程执行，否则直接执行"""
+        if self.loop != None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(func, *args)
+        else:
+            func(*args)
+
+    def add_cip(self, cip_data: CIPData, period = 0.5, name = ''):
+        """添加CIP端点，PLC连接在线程池中打开并保持"""
+        state = {'plc': None}
+
+        def poll(stamp):
+            if state['plc'] == None:
+                state['plc'] = PLC(cip_data.plc_ip)
+            try:
+                cip_data.read_all(state['plc'], stamp)
+            except Exception:
+                state['plc'].Close()
+                state['plc'] = None
+                raise
+            return True
+
+        self.endpoints.append(Endpoint(name or cip_data.plc_ip, poll, period))
+
+    async def run_endpoint(self, endpoint: Endpoint):
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+            stamp = self.clock()
+            try:
+                ok = await loop.run_in_executor(self.executor, endpoint.poll, stamp)
+            except Exception as reason:
+                ok = False
+                warnings.warn(f'[{endpoint.name}]采集失败：{reason}')
+                if self.logger:
+                    self.logger.error(f'[{endpoint.name}]采集失败：{reason}')
+            endpoint.cycles += 1
+            if ok:
+                endpoint.last_frame = stamp
+            else:
+                endpoint.errors += 1
+
+            deadline += endpoint.period
+            now = time.monotonic()
+            if deadline < now:#超时则跳过错过的周期
+                deadline = now
+
+    async def main(self):
+        for i in self.endpoints:
+            i.task = asyncio.create_task(self.run_endpoint(i))
+        while True:#端点可能在运行中增删，持续运行直到被取消
+            await asyncio.sleep(3600)
+
+    def run_loop(self):
+        try:
+            self.loop.run_until_complete(self.main())
+        except asyncio.CancelledError:
+            pass
+        pending = asyncio.all_tasks(self.loop)#等待已取消的端点任务结束
+        if pending:
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+    def cancel_all(self):
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+
+    def start(self):
+        if self.thread:
+            return None
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread == None:
+            return None
+        self.loop.call_soon_threadsafe(self.cancel_all)
+        self.thread.join()
+        self.loop.close()
+        self.executor.shutdown()
+        self.thread = None
+        self.loop = None
+
+    def get_status(self):
+        """各端点的周期数、失败次数与最近一帧时间戳"""
+        return {i.name: {'cycles': i.cycles, 'errors': i.errors, 'last_frame': i.last_frame} for i in self.endpoints}
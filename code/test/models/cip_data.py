@@ -1,7 +1,8 @@
-from utils.statepoint import Statepoint
+from utils.statepoint import Statepoint, point_time
 from pylogix import PLC
 from pylogix.lgx_response import Response
 from threading import Thread
+from utils.deadband import Deadband
 import time
 
 class CIPData:
@@ -13,33 +14,62 @@ class CIPData:
             "GB_PEISHUI[58]": ['5#结晶器流量', '5#结晶器水温差', '5#二冷水总管压力', '5#结晶器进水温度', '5#结晶器水压', '5#二冷水总管温度']
         }#PLC标签 : 有意义的名称
 
-        self.name2value = {j: 0 for i in self.tags2name.vwalues() for j in i}#缓存所有名称的当前值
+        self.name2value = {j: 0 for i in self.tags2name.values() for j in i}#缓存所有名称的当前值
 
         self.name2point = {}
 
         self.plc_ip = ip
         self.thread_update = None
         self.thread_run = False
+        self.last_frame = None#最近一次读取的采集时刻
+        self.deadbands = {}#名称 -> Deadband
 
-    def deliver_value(self, name, value):
-        if self.get_value(name) == value:
+    def set_deadband(self, name, absolute = 0.0, percent = 0.0, heartbeat = 0.0):
+        """为数值通道设置死区：变化量不超过max(absolute, 上次值*percent%)时不推送，heartbeat(s)内至少推送一次"""
+        if name not in self.name2value:
+            raise NameError(f"Name {name} is not defined.")
+        self.deadbands[name] = Deadband(absolute, percent, heartbeat)
+
+    def deliver_value(self, name, value, stamp = None):
+        deadband = self.deadbands.get(name)
+        if deadband == None:
+            if self.get_value(name) == value:
+                return None
+        elif not deadband.check(value, time.monotonic()):#被抑制的值不更新缓存，之后的变化仍相对最近一次推送的值计算
             return None
-        
+
         self.name2value[name] = value
 
         if name in self.name2point:
             for point in self.name2point[name]:
-                point.inject(value)
+                if stamp == None:
+                    point.inject(value)
+                else:
+                    point.inject_at(value, stamp)
 
-    def process_response(self, response: Response, name: str | list[str]):
+    def process_response(self, response: Response, name: str | list[str], stamp = None):
         if response.Status == "Success":
             if isinstance(name, list):
-                _ = [self.deliver_value(name[i], response.Value[i]) for i in range(len(name))]
+                _ = [self.deliver_value(name[i], response.Value[i], stamp) for i in range(len(name))]
             else:
-                self.deliver_value(name, response.Value)
+                self.deliver_value(name, response.Value, stamp)
         else:
             print("Error:", response.Status)
 
+    def read_all(self, plc: PLC, stamp = None):
+        """读取一次全部标签并推送变化
+        stamp为调度器给出的帧时刻，给出时本帧所有值都以它为时间戳；否则每个标签的值携带其读取调用前后的中点时刻
+        """
+        for tag, name in self.tags2name.items():
+            begin = time.monotonic()
+            wall = point_time()
+            if isinstance(name, list):
+                ret = plc.Read(tag, len(name))
+            else:
+                ret = plc.Read(tag)
+            self.process_response(ret, name, stamp if stamp != None else wall + (time.monotonic() - begin) / 2)
+        self.last_frame = stamp
+
     def update_forever(self, sleep_second = 0.5):
         ip = self.plc_ip
         if ip == '':
@@ -49,12 +79,7 @@ class CIPData:
         with PLC(ip) as plc:
             while retry_count > 0 and self.thread_run:
                 try:
-                    for tag, name in self.tags2name.items():
-                        if isinstance(name, list):
-                            ret = plc.Read(tag, len(name))
-                        else:
-                            ret = plc.Read(tag)
-                        self.process_response(ret, name)
+                    self.read_all(plc)
                     retry_count = 3
                 except:
                     retry_count -= 1
@@ -1,14 +1,14 @@
-import time, threading, snap7.util
-from utils.s7data import S7Client
+import time, threading
+from utils.s7data import S7data
 from utils.logger import Logger
 from dbutils.pooled_db import PooledDB
 
 
 class MysqlData:
     """mysql与PLC的数据交互"""
-    def __init__(self, mysql_pool: PooledDB, s7conn: S7Client, logger: Logger):
+    def __init__(self, mysql_pool: PooledDB, s7data: S7data, logger: Logger):
         self.mysql_pool = mysql_pool
-        self.s7conn = s7conn
+        self.s7data = s7data
         self.logger = logger
         self.datas = {"is_use_model": False, "is_use_length": False, "棒一变棒三定尺": False}
         self.model_datas = [0 for i in range(8)]
@@ -60,17 +60,16 @@ class MysqlData:
 
     def write_forever(self, fru=500):
         while self.thread_flag:
-            data = bytearray(1)
-            snap7.util.set_bool(data, 0, 1, self.datas["is_use_model"])
-            snap7.util.set_bool(data, 0, 0, not self.datas["棒一变棒三定尺"])
-            snap7.util.set_bool(data, 0, 3, self.datas["棒一变棒三定尺"])
-            self.s7conn.db_write(420, 32, data)
-            self.s7conn.db_write(421, 32, data)
+            values = {}
+            for db in (420, 421):
+                values[f"DB{db}使用模型补偿"] = bool(self.datas["is_use_model"])
+                values[f"DB{db}棒一定尺"] = not self.datas["棒一变棒三定尺"]
+                values[f"DB{db}棒三定尺"] = bool(self.datas["棒一变棒三定尺"])
+                for i in range(8):
+                    values[f"DB{db}{i+1}流模型补偿"] = float(self.model_datas[i])
+            try:
+                self.s7data.write_values(values)#内容未变化时不会产生写入
+            except RuntimeError as e:
+                self.logger.error(f"[s7]:{e}")
 
-            data = bytearray(32)
-            for i in range(8):
-                snap7.util.set_real(data, i*4, self.model_datas[i])
-            self.s7conn.db_write(420, 0, data)
-            self.s7conn.db_write(421, 0, data)
-
-            time.sleep(fru/1000)
\ No newline at end of file
+            time.sleep(fru/1000)
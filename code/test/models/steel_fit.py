@@ -1,34 +1,167 @@
-from utils.statepoint import Statepoint
+from utils.statepoint import Statepoint, point_time, call_later
 from models.data_sender import Sender
 import numpy as np
 from scipy import interpolate, integrate
 from collections import deque
 from models.cip_data import CIPData
 from utils.s7data import S7data
-import datetime, logging, time, threading, queue
+from models.ts_store import FrameTable, RingFile, get_column_store, append_tail
+import datetime, logging, threading, queue, os
 
 class BufferPoint(Statepoint):
+    """缓存最近maxlen个(值, 时间戳)的点，值与时间分别存于预分配的float64环形数组，写入O(1)且不分配内存
+    maxlen为None时不限长度，写满后容量翻倍。
+    """
     def __init__(self, initvalue = None, initstate = False, maxlen: int | None = 3000):
-        super().__init__(deque(maxlen = maxlen), initstate)
+        super().__init__(None, initstate)
+        self.maxlen = maxlen
+        capacity = maxlen if maxlen != None else 1024
+        self.values = np.empty(capacity)
+        self.times = np.empty(capacity)
+        self.head = 0   #下一个写入位置
+        self.size = 0
+        self.buffer_lock = threading.Lock()
+        self.gaps = deque(maxlen = 100)#数据源中断形成的缺口[[start, end], ...]，end为None表示仍在中断
+        self.ring = None    #映射的历史文件
 
     def inject(self, data):
-        self.data.append((data, datetime.datetime.now().timestamp()))
+        self.inject_at(data, point_time())
+
+    def inject_at(self, data, timestamp):
+        """按数据源给出的读取时刻记录，避免推送线程调度延迟带来的时间偏差"""
+        if data == None:
+            return None
+        with self.buffer_lock:
+            if self.size == len(self.values) and self.maxlen == None:
+                self.values = np.concatenate((self.values, np.empty(len(self.values))))
+                self.times = np.concatenate((self.times, np.empty(len(self.times))))
+                self.head = self.size
+            self.append(data, timestamp)
+            self.data = data
+
+    def append(self, data, timestamp):
+        """写入一个样本，需持有buffer_lock"""
+        self.values[self.head] = data
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % len(self.values)
+        if self.size < len(self.values):
+            self.size += 1
+        if self.ring != None:
+            self.ring.commit(self.head, self.size)
+
+    def persist(self, path, gap_threshold = 60, logger = None):
+        """把缓存映射到文件path，恢复文件中的历史，之后的写入直接落入文件并由后台线程写回磁盘
+        恢复的最后一个样本距当前超过gap_threshold(s)时把中间的停机时段标记为缺口，较短的重启按正常采样间隔处理。
+        """
+        if self.maxlen == None:
+            raise ValueError('不限长度的BufferPoint不能映射到文件')
+        with self.buffer_lock:
+            first = self.head if self.size == len(self.values) else 0
+            rows = (np.arange(self.size) + first) % len(self.values)
+            values, times = self.values[rows], self.times[rows]
+            self.ring = RingFile(path, self.maxlen, ['value'], logger)
+            self.values = self.ring.values[:, 0]
+            self.times = self.ring.times
+            self.head = self.ring.head
+            self.size = self.ring.size
+            last = float(self.times[self.head - 1]) if self.size > 0 else None
+            for value, timestamp in zip(values, times):#补入映射前已收到且比文件更新的样本
+                if last == None or timestamp > last:
+                    self.append(value, timestamp)
+            if self.size > 0 and self.data == None:
+                self.data = float(self.values[self.head - 1])
+        now = point_time()
+        if last != None and now - last > gap_threshold:
+            self.mark_gap(last, now)
+        return last
+
+    def mark_gap(self, start, end = None):
+        if self.gaps and self.gaps[-1][0] == start:
+            self.gaps[-1][1] = end
+        else:
+            self.gaps.append([start, end])
+
+    def has_gap(self, left, right):
+        """[left, right]内是否存在数据缺口，用于区分数据缺失与信号平稳"""
+        return any(start < right and (end == None or end > left) for start, end in list(self.gaps))
+
+    def __len__(self):
+        return self.size
 
     def get_buffer(self):
-        res = self.data.copy()
-        last = res[-1][0]
-        res.append((last, datetime.datetime.now().timestamp() + 0.001))#确保时间序列完整性
-        return res
+        """按时间顺序返回(值数组, 时间数组, 末尾样本)
+        环形数组尚未写满时值与时间为无拷贝的视图，视图在缓冲区写满前保持有效，调用方应立即使用或自行拷贝；写满后拼接为一份拷贝。
+        末尾样本为(最新值, 当前时间)，用于把序列延伸到当前时刻，不写入缓存，由调用方按需用append_tail追加；无数据时为None。
+        """
+        with self.buffer_lock:
+            if self.size == 0:
+                return np.empty(0), np.empty(0), None
+            values, times = self._slice(0, self.size)
+            return values, times, (values[-1], point_time() + 0.001)
+
+    def _slice(self, lo, hi):
+        """逻辑序列[lo, hi)的(值数组, 时间数组)，物理上连续时为视图，跨越环形数组末尾时拼接为拷贝，需持有buffer_lock"""
+        first = self.head if self.size == len(self.times) else 0
+        start = (first + lo) % len(self.times)
+        end = start + hi - lo
+        if end <= len(self.times):
+            return self.values[start:end], self.times[start:end]
+        end -= len(self.times)
+        return (np.concatenate((self.values[start:], self.values[:end])),
+                np.concatenate((self.times[start:], self.times[:end])))
+
+    def _search(self, t, side = 'left'):
+        """在按时间排序的逻辑序列中二分查找t的插入位置，需持有buffer_lock"""
+        if self.size < len(self.times):
+            return int(np.searchsorted(self.times[:self.size], t, side))
+        older = self.times[self.head:]
+        index = int(np.searchsorted(older, t, side))
+        if index < len(older):
+            return index
+        return len(older) + int(np.searchsorted(self.times[:self.head], t, side))
+
+    def window(self, t0, t1, pad = 0):
+        """覆盖[t0, t1]的样本：t0处及之前最近的一个样本到t1处及之后最近的一个样本，两侧再各多取pad个
+        返回(值数组, 时间数组, 末尾样本)，值与时间同get_buffer按需为视图，长度只与区间内的样本数有关；
+        区间超出最新样本时末尾样本为(最新值, 当前时间)，否则为None。
+        """
+        with self.buffer_lock:
+            if self.size == 0:
+                return np.empty(0), np.empty(0), None
+            lo = max(0, self._search(t0, 'right') - 1 - pad)
+            hi = min(self.size, self._search(t1, 'left') + 1 + pad)
+            if lo >= hi:
+                return np.empty(0), np.empty(0), None
+            values, times = self._slice(lo, hi)
+            tail = None
+            if hi == self.size and t1 > times[-1]:
+                tail = (values[-1], point_time() + 0.001)
+            return values, times, tail
+
+    def value_at(self, t):
+        """t时刻的值：t及之前最近一个样本的值（采集端只推送变化，样本之间保持不变），早于全部样本时返回None"""
+        with self.buffer_lock:
+            index = self._search(t, 'right') - 1
+            if index < 0:
+                return None
+            first = self.head if self.size == len(self.times) else 0
+            return float(self.values[(first + index) % len(self.values)])
+
+    def count_in(self, t0, t1):
+        """时间在[t0, t1]内的样本数"""
+        with self.buffer_lock:
+            return max(0, self._search(t1, 'right') - self._search(t0, 'left'))
     
 
 class billet_data_gatherer:
     """钢坯数据采集者"""
-    def __init__(self, dspeed_point: BufferPoint, cutting_sig_point: Statepoint, sizing_point: Statepoint, flow_rate_point_list: list[BufferPoint],
+    def __init__(self, dspeed_point: BufferPoint, cutting_sig_point: Statepoint, sizing_point: Statepoint, flow_table: FrameTable, flow_columns: list[str],
                  logger: logging.Logger, strand_no: int, result_queue: queue.Queue):
         self.dspeed_point = dspeed_point
         self.cutting_sig_point = cutting_sig_point
         self.sizing_point = sizing_point
-        self.flow_rate_point_list = flow_rate_point_list
+        self.flow_table = flow_table        #五段流量所在的列式表
+        self.flow_columns = flow_columns
         self.logger = logger
         self.strand_no = strand_no
         self.result_queue = result_queue
@@ -39,23 +172,23 @@ class billet_data_gatherer:
         self.cutting_sig_point.set_excite_action(self.cutting_action)
         
     def cutting_action(self):
-        cutting_time = datetime.datetime.now().timestamp()
+        cutting_time = point_time()
         sizing = self.sizing_point.data / 1000 #mm转换为m
 
         self.logger.debug(f"{self.strand_no}流开始切割")
 
-        time.sleep(30)#现场数据延迟
-        dspeed_buffer: deque = self.dspeed_point.get_buffer()#获得拉速队列
-        flow_rate_buffer_list: list[deque] = [self.flow_rate_point_list[i].get_buffer() for i in range(5)]
+        #现场数据延迟，延时计算放到定时器线程，不占用状态更新线程
+        call_later(30, self.calculate, cutting_time, sizing)
 
-        if len(dspeed_buffer) < 10:
+    def calculate(self, cutting_time, sizing):
+        dspeed_values, dspeed_times = append_tail(*self.dspeed_point.get_buffer())#获得拉速序列，末尾延伸到当前时刻
+
+        if len(dspeed_times) < 10:
             self.logger.debug(f"{self.strand_no}流已统计数据量不足，无法计算")
             return
 
-        data_tuple, time_tuple = zip(*dspeed_buffer)
-
-        x = np.array(time_tuple) #时间数组
-        y = np.array(data_tuple) / 60 #拉速转换为m/s
+        x = dspeed_times #时间数组
+        y = dspeed_values / 60 #拉速转换为m/s
         vt_func = interpolate.interp1d(x, y, kind='cubic')#三次样条插值
         entry_time = self._binary_search_start(vt_func, cutting_time, sizing + self.MOLD_TO_CUTTER_DISTANCE)#头部进入结晶器
 
@@ -64,9 +197,12 @@ class billet_data_gatherer:
             return
         
         exit_time = self._binary_search_end(vt_func, entry_time, sizing + self.CRITICAL_ZONE_LENGTH)#尾部离开关键区域
+        if self.dspeed_point.has_gap(entry_time, cutting_time) or self.flow_table.has_gap(entry_time, exit_time):
+            self.logger.debug(f"{self.strand_no}流计算区间内数据采集中断，无法计算")
+            return
         dspeed_avg = (sizing + self.CRITICAL_ZONE_LENGTH) / (exit_time - entry_time) * 60
 
-        self.create_data(cutting_time, entry_time, exit_time, self.flow_rate_total(flow_rate_buffer_list, entry_time, exit_time), dspeed_avg)
+        self.create_data(cutting_time, entry_time, exit_time, self.flow_rate_total(entry_time, exit_time), dspeed_avg)
         
     def _binary_search_start(self, func, upper_limit, target):
         """二分查找计算钢坯进入关键区域时间
@@ -107,21 +243,14 @@ class billet_data_gatherer:
         return integrate.quad(vt_func, lower, upper)[0]
     
                                 #五段流量队列
-    def flow_rate_total(self, deque_list: list[deque], start_time, end_time):
-        res = []
-        for dequei in deque_list:
-            data_tuple, time_tuple = zip(*dequei)
-            x = np.array(time_tuple)
-            y = np.array(data_tuple) / 3600
-            if len(x) < 4:
-                avg = np.mean(y)
-                vt_func = lambda xx: avg
-            else:
-                vt_func = interpolate.interp1d(x, y, kind='cubic')
-            total = integrate.quad(vt_func, start_time, end_time)[0]
-            res.append(total)
-
-        return sum(res)
+    def flow_rate_total(self, start_time, end_time):
+        """五段流量在区间内的总水量：一次取出对齐的五列，共用一条三次样条逐列积分"""
+        y, x = append_tail(*self.flow_table.window(self.flow_columns, start_time, end_time, pad = 2))
+        y = y / 3600
+        if len(x) < 4:
+            return float(np.sum(np.mean(y, axis = 0)) * (end_time - start_time))
+        spline = interpolate.make_interp_spline(x, y, k = 3, axis = 0)
+        return float(np.sum(spline.integrate(start_time, end_time)))
     
     def create_data(self, cutting_time, entry_time, exit_time, water_total, dspeed_avg):
         self.logger.debug(f"{self.strand_no}流钢坯计算结果：")
@@ -134,17 +263,27 @@ class billet_data_gatherer:
 
 class SteelFit:
     """拟合模块"""
-    def __init__(self, s7_data_20: S7data, s7_data_215: S7data, cip_data: CIPData, sender: Sender, logger: logging.Logger):
+    def __init__(self, s7_data_20: S7data, s7_data_215: S7data, cip_data: CIPData, sender: Sender, logger: logging.Logger, history_dir: str | None = None):
         #初始化需要的数据点
-        self.water_temperature_buffer: BufferPoint = cip_data.make_point("5#二冷水总管温度", BufferPoint)
-        self.water_pressure_buffer: BufferPoint = cip_data.make_point("5#二冷水总管压力", BufferPoint)
+        #CIP数据按采集帧写入共享的列式表，同一帧的各通道共用时间轴
+        self.cip_table = get_column_store().table(f"cip@{cip_data.plc_ip}")
+        self.water_columns = ["5#二冷水总管温度", "5#二冷水总管压力", "5#结晶器水温差"]
+        self.cip_table.attach(cip_data, self.water_columns)
         self.steel_temperature_buffer: BufferPoint = s7_data_20.make_point("中间包连续测温温度", BufferPoint)
-        self.water_temperature_difference_buffer: BufferPoint = cip_data.make_point("5#结晶器水温差", BufferPoint)
 
         self.dspeed_buffer = [s7_data_20.make_point(f"{i}流结晶器拉速", BufferPoint) for i in range(1, 9)]
         self.cutting_sig_point = [s7_data_215.make_point(f"L{i}切割信号[0]") for i in range(1, 9)]
         self.sizing_point = [s7_data_20.make_point(f"{i}流定尺") for i in range(1, 9)]
-        self.flow_rate_point_list = [[cip_data.make_point(f"5#水流量-{i}流-{j}段", BufferPoint) for j in range(1, 6)] for i in range(1, 9)]
+        self.flow_columns = [[f"5#水流量-{i}流-{j}段" for j in range(1, 6)] for i in range(1, 9)]
+        for columns in self.flow_columns:
+            self.cip_table.attach(cip_data, columns)
+
+        if history_dir != None:#缓存映射到文件，重启后恢复历史，切割后即可计算而无需重新积累拉速数据
+            os.makedirs(history_dir, exist_ok = True)
+            for i, point in enumerate(self.dspeed_buffer):
+                point.persist(os.path.join(history_dir, f"dspeed_{i + 1}.ring"), logger = logger)
+            self.steel_temperature_buffer.persist(os.path.join(history_dir, "steel_temperature.ring"), logger = logger)
+            self.cip_table.persist(os.path.join(history_dir, "cip.ring"), logger = logger)
 
         self.sender = sender
         self.logger = logger
@@ -152,11 +291,12 @@ class SteelFit:
 
         self.billet_data_gatherer_list = [
             billet_data_gatherer(
-                #传入拉速、切割信号、定尺、流量list
+                #传入拉速、切割信号、定尺、流量表与该流五段流量的列名
                 self.dspeed_buffer[i],
                 self.cutting_sig_point[i],
                 self.sizing_point[i],
-                self.flow_rate_point_list[i],
+                self.cip_table,
+                self.flow_columns[i],
                 logger,
                 i + 1,
                 self.task_queue
@@ -195,27 +335,24 @@ class SteelFit:
                 self.logger.error(f"铸机数据计算过程中出现意外:{e}")
 
     def cal_data(self, entry_time, exit_time):
-        wt = self.interval_avg(self.water_temperature_buffer.get_buffer(), entry_time, exit_time)
-        wp = self.interval_avg(self.water_pressure_buffer.get_buffer(), entry_time, exit_time)
-        wps = self.interval_sd(self.water_pressure_buffer.get_buffer(), entry_time, exit_time)
-        st = self.interval_avg(self.steel_temperature_buffer.get_buffer(), entry_time, exit_time)
-        wtd = self.interval_avg(self.water_temperature_difference_buffer.get_buffer(), entry_time, exit_time)
+        #只取计算区间两侧各多2个样本，插值与积分的开销与区间长度相关而与缓存长度无关
+        values, times = append_tail(*self.cip_table.window(self.water_columns, entry_time, exit_time, pad = 2))
+        wt, wp, wtd = self.interval_avg((values, times), entry_time, exit_time)#温度、压力、温差共用一条样条
+        wps = self.interval_sd((values[:, 1], times), entry_time, exit_time)
+        st = self.interval_avg(append_tail(*self.steel_temperature_buffer.window(entry_time, exit_time, pad = 2)), entry_time, exit_time)
 
         return (float(wt), float(wp), float(wps), float(st), float(wtd))
 
     def interval_avg(self, buffer, left, right):
-        data_tuple, time_tuple = zip(*buffer)
-        x = np.array(time_tuple)
-        y = np.array(data_tuple)
-        func = interpolate.interp1d(x, y, kind = "cubic")
-        inte = integrate.quad(func, left, right)[0]
+        """区间平均值，buffer为(值数组, 时间数组)，值为二维时按列分别计算"""
+        y, x = buffer
+        spline = interpolate.make_interp_spline(x, y, k = 3, axis = 0)
+        inte = spline.integrate(left, right)
 
         return inte / (right - left)
 
     def interval_sd(self, buffer, left, right):
-        data_tuple, time_tuple = zip(*buffer)
-        x = np.array(time_tuple)
-        y = np.array(data_tuple)
+        y, x = buffer
         func = interpolate.interp1d(x, y, kind = "cubic")
         inte = integrate.quad(func, left, right)[0]
         avg = inte / (right - left)
@@ -0,0 +1,370 @@
+import numpy as np
+from collections import deque
+from utils.statepoint import point_time
+import threading, weakref, warnings, json, os
+"""进程级列式时序存储：同一采集源的点共享一条时间轴，每个点一列，多点对齐查询直接得到二维切片
+环形数据可映射到文件，进程重启后重新打开即可恢复最近的历史。
+"""
+
+def append_tail(values, times, tail = None):
+    """把get_buffer/window返回的末尾样本(值, 时间)追加到序列后，得到一份新的拷贝；tail为None时原样返回"""
+    if tail == None:
+        return values, times
+    return np.concatenate((values, [tail[0]])), np.append(times, tail[1])
+
+
+class RingFile:
+    """环形缓冲的内存映射文件
+    文件头为int64[8]：标识、版本、容量、列数、下一个写入行、行数、列名长度、数据起始偏移，之后是列名json；
+    数据区为times[capacity]与values[capacity, 列数]，写入直接落入页缓存，进程退出不丢失，
+    由Flusher在后台定期写回磁盘以应对断电。
+    打开已有文件时容量与列名一致则原地映射，否则按列名把最近的行复制到按新布局创建的文件中。
+    """
+    MAGIC = 0x474E4952   #'RING'
+    VERSION = 1
+
+    def __init__(self, path, capacity, names: list, logger = None):
+        self.path = path
+        self.capacity = capacity
+        self.names = list(names)
+        self.logger = logger
+        old = self.load(path)
+        if old != None and old[0] == self.capacity and old[1] == self.names:
+            self.map(np.memmap(path, dtype=np.uint8, mode='r+'))
+        else:
+            self.create(old)
+        get_flusher().add(self)
+
+    def load(self, path):
+        """读取已有文件，返回(容量, 列名, 按时间排序的times, values)，不存在或无法识别时返回None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            mm = np.memmap(path, dtype=np.uint8, mode='r')
+            header = mm[:64].view(np.int64)
+            magic, version, capacity, columns, head, size, names_len, offset = (int(i) for i in header)
+            if magic != self.MAGIC or version != self.VERSION or not 0 <= size <= capacity or offset + capacity * (columns + 1) * 8 > len(mm):
+                raise ValueError('文件头无效')
+            names = json.loads(bytes(mm[64:64 + names_len]).decode('utf-8'))
+            times = mm[offset:offset + capacity * 8].view(np.float64)
+            values = mm[offset + capacity * 8:offset + capacity * (columns + 1) * 8].view(np.float64).reshape(capacity, columns)
+            first = head if size == capacity else 0
+            rows = (np.arange(size) + first) % capacity
+            return capacity, names, times[rows], values[rows]
+        except Exception as reason:
+            warnings.warn(f'历史文件{path}无法读取，将重新创建：{reason}')
+            if self.logger:
+                self.logger.error(f'历史文件{path}无法读取，将重新创建：{reason}')
+            return None
+
+    def create(self, old):
+        """按当前布局创建文件并复制old中同名列最近的行；先写临时文件再替换，已映射旧文件的数组不受影响"""
+        names = json.dumps(self.names, ensure_ascii=False).encode('utf-8')
+        offset = (64 + len(names) + 4095) // 4096 * 4096
+        total = offset + self.capacity * (len(self.names) + 1) * 8
+        temp = self.path + '.tmp'
+        mm = np.memmap(temp, dtype=np.uint8, mode='w+', shape=total)
+        mm[64:64 + len(names)] = np.frombuffer(names, dtype=np.uint8)
+        header = mm[:64].view(np.int64)
+        header[:] = (self.MAGIC, self.VERSION, self.capacity, len(self.names), 0, 0, len(names), offset)
+        self.map(mm)
+        self.values[:] = np.nan
+        if old != None:
+            capacity, names, times, values = old
+            count = min(len(times), self.capacity)
+            self.times[:count] = times[len(times) - count:]
+            for index, name in enumerate(self.names):
+                if name in names:
+                    self.values[:count, index] = values[len(times) - count:, names.index(name)]
+            self.commit(count % self.capacity, count)
+        mm.flush()
+        os.replace(temp, self.path)
+
+    def map(self, mm):
+        self.mm = mm
+        self.header = mm[:64].view(np.int64)
+        offset = int(self.header[7])
+        self.times = mm[offset:offset + self.capacity * 8].view(np.float64)
+        self.values = mm[offset + self.capacity * 8:offset + self.capacity * (len(self.names) + 1) * 8].view(np.float64).reshape(self.capacity, len(self.names))
+
+    @property
+    def head(self):
+        return int(self.header[4])
+
+    @property
+    def size(self):
+        return int(self.header[5])
+
+    def commit(self, head, size):
+        """记录写入位置，数据先于位置写入，中途退出最多丢失最后一行"""
+        self.header[4] = head
+        self.header[5] = size
+
+    def flush(self):
+        self.mm.flush()
+
+
+class Flusher:
+    """后台线程定期把所有映射文件写回磁盘"""
+    def __init__(self, interval = 5, logger = None):
+        self.interval = interval
+        self.logger = logger
+        self.files = weakref.WeakSet()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.thread_run = False
+        self.wakeup = threading.Event()
+
+    def add(self, ring: RingFile):
+        with self.lock:
+            self.files.add(ring)
+
+    def flush(self):
+        with self.lock:
+            files = list(self.files)
+        for ring in files:
+            try:
+                ring.flush()
+            except Exception as reason:
+                warnings.warn(f'历史文件{ring.path}写回失败：{reason}')
+                if self.logger:
+                    self.logger.error(f'历史文件{ring.path}写回失败：{reason}')
+
+    def run(self):
+        while self.thread_run:
+            self.wakeup.wait(self.interval)
+            self.flush()
+
+    def start(self):
+        if self.thread:
+            return None
+        self.thread_run = True
+        self.thread = threading.Thread(target=self.run, daemon=True, name='ring-flusher')
+        self.thread.start()
+
+    def stop(self):
+        """写回一次后停止"""
+        self.thread_run = False
+        self.wakeup.set()
+        if self.thread == None:
+            return None
+        self.thread.join()
+        self.thread = None
+        self.wakeup.clear()
+
+
+default_flusher = None
+flusher_lock = threading.Lock()
+
+def get_flusher():
+    """进程级共享的写回线程，首次使用时创建并启动"""
+    global default_flusher
+    with flusher_lock:
+        if default_flusher == None:
+            default_flusher = Flusher()
+            default_flusher.start()
+        return default_flusher
+
+class StorePoint:
+    """列式存储的输入端，作为make_point的点类型接收数据源推送并写入所属表的一列"""
+    __slots__ = ('table', 'column')
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+
+    def inject(self, data):
+        self.table.put(self.column, data, point_time())
+
+    def inject_at(self, data, timestamp):
+        self.table.put(self.column, data, timestamp)
+
+    def mark_gap(self, start, end = None):
+        self.table.mark_gap(start, end)
+
+
+class FrameTable:
+    """一个采集源的列式环形表：每行是一次采集帧，一个时间戳加各列的值
+    时间戳相同的推送写入同一行（采集引擎给同一帧的值相同的时间戳），每个值都保持其采样时刻，不前移到行首；
+    同一时刻同一列的重复推送以后到的值为准。
+    新行先沿用上一行各列的值（采集端只推送变化），未收到过数据的列为NaN。
+    """
+    def __init__(self, name, capacity = 3000):
+        self.name = name
+        self.capacity = capacity
+        self.columns = {}   #名称 -> 列序号
+        self.times = np.empty(capacity)
+        self.values = np.full((capacity, 0), np.nan)
+        self.head = 0       #下一个写入行
+        self.size = 0
+        self.lock = threading.Lock()
+        self.gaps = deque(maxlen = 100)
+        self.ring = None    #映射的历史文件
+
+    def column(self, name):
+        """名称对应的列序号，不存在时新增一列；已映射到文件时按新布局重建文件"""
+        with self.lock:
+            index = self.columns.get(name)
+            if index == None:
+                index = self.columns[name] = len(self.columns)
+                if self.ring != None:
+                    self.map_ring(self.ring.path, self.ring.logger)
+                else:
+                    self.values = np.concatenate((self.values, np.full((self.capacity, 1), np.nan)), axis = 1)
+            return index
+
+    def persist(self, path, gap_threshold = 60, logger = None):
+        """把表映射到文件path，恢复文件中同名列的历史，之后的写入直接落入文件并由后台线程写回磁盘
+        恢复的最后一行距当前超过gap_threshold(s)时把中间的停机时段标记为缺口，较短的重启按正常采样间隔处理。
+        """
+        with self.lock:
+            last = self.map_ring(path, logger)
+        now = point_time()
+        if last != None and now - last > gap_threshold:
+            self.mark_gap(last, now)
+        return last
+
+    def map_ring(self, path, logger = None):
+        """切换到映射文件并补入内存中比文件更新的行，返回文件中最后一行的时刻，需持有lock"""
+        rows = self._rows(0, self.size)
+        times = self.times[rows]
+        values = np.full((len(rows), len(self.columns)), np.nan)
+        values[:, :self.values.shape[1]] = self.values[rows]
+        self.ring = RingFile(path, self.capacity, sorted(self.columns, key=self.columns.get), logger)
+        self.times = self.ring.times
+        self.values = self.ring.values
+        self.head = self.ring.head
+        self.size = self.ring.size
+        last = float(self.times[(self.head - 1) % self.capacity]) if self.size > 0 else None
+        for timestamp, row in zip(times, values):
+            if last == None or timestamp > last:
+                self.new_row(timestamp)
+                current = (self.head - 1) % self.capacity
+                self.values[current] = np.where(np.isnan(row), self.values[current], row)
+        self.ring.commit(self.head, self.size)
+        return last
+
+    def point_type(self, name):
+        """用作make_point的point_type，数据源创建的点写入名为name的列"""
+        column = self.column(name)
+        return lambda *args: StorePoint(self, column)
+
+    def attach(self, data_source, names):
+        """在data_source(S7data/CIPData)上为names逐一创建写入本表的点，返回列序号"""
+        for name in names:
+            data_source.make_point(name, self.point_type(name))
+        return [self.columns[name] for name in names]
+
+    def put(self, column, value, timestamp):
+        if value == None:
+            return None
+        with self.lock:
+            if self.size == 0 or timestamp > self.times[(self.head - 1) % self.capacity]:
+                self.new_row(timestamp)
+            #时间戳早于当前行的乱序值并入当前行，不改写已有的历史行
+            self.values[(self.head - 1) % self.capacity, column] = value
+            if self.ring != None:
+                self.ring.commit(self.head, self.size)
+
+    def new_row(self, timestamp):
+        """开始新的一行，需持有lock"""
+        row = self.head
+        if self.size > 0:
+            self.values[row] = self.values[(row - 1) % self.capacity]
+        self.times[row] = timestamp
+        self.head = (row + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def mark_gap(self, start, end = None):
+        with self.lock:
+            if self.gaps and self.gaps[-1][0] == start:
+                self.gaps[-1][1] = end
+            else:
+                self.gaps.append([start, end])
+
+    def has_gap(self, left, right):
+        """[left, right]内是否存在数据缺口"""
+        return any(start < right and (end == None or end > left) for start, end in list(self.gaps))
+
+    def __len__(self):
+        return self.size
+
+    def _search(self, t, side = 'left'):
+        """在按时间排序的逻辑行序列中二分查找t的插入位置，需持有lock"""
+        if self.size < self.capacity:
+            return int(np.searchsorted(self.times[:self.size], t, side))
+        older = self.times[self.head:]
+        index = int(np.searchsorted(older, t, side))
+        if index < len(older):
+            return index
+        return len(older) + int(np.searchsorted(self.times[:self.head], t, side))
+
+    def _rows(self, lo, hi):
+        """逻辑行[lo, hi)对应的物理行号，需持有lock"""
+        first = self.head if self.size == self.capacity else 0
+        return (np.arange(lo, hi) + first) % self.capacity
+
+    def window(self, names, t0, t1, pad = 0):
+        """多列对齐查询：返回(值数组[行, 列], 时间数组, 末尾样本)，列顺序同names
+        行范围同BufferPoint.window：覆盖[t0, t1]并在两侧各多取pad行；区间超出最新一行时末尾样本为(最新一行, 当前时间)，否则为None。
+        """
+        with self.lock:
+            columns = [self.columns[name] for name in names]
+            if self.size == 0:
+                return np.empty((0, len(columns))), np.empty(0), None
+            lo = max(0, self._search(t0, 'right') - 1 - pad)
+            hi = min(self.size, self._search(t1, 'left') + 1 + pad)
+            if lo >= hi:
+                return np.empty((0, len(columns))), np.empty(0), None
+            rows = self._rows(lo, hi)
+            times = self.times[rows]
+            values = self.values[np.ix_(rows, columns)]
+            tail = None
+            if hi == self.size and t1 > times[-1]:
+                tail = (values[-1], point_time() + 0.001)
+            return values, times, tail
+
+    def value_at(self, name, t):
+        """t时刻某列的值（t及之前最近一行），早于全部行时返回None"""
+        with self.lock:
+            index = self._search(t, 'right') - 1
+            if index < 0:
+                return None
+            return float(self.values[self._rows(index, index + 1)[0], self.columns[name]])
+
+    def count_in(self, t0, t1):
+        """时间在[t0, t1]内的行数"""
+        with self.lock:
+            return max(0, self._search(t1, 'right') - self._search(t0, 'left'))
+
+
+class ColumnStore:
+    """进程级列式存储，按采集源名称管理FrameTable"""
+    def __init__(self, capacity = 3000):
+        self.capacity = capacity
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def table(self, name, capacity = None):
+        """名称对应的表，不存在时按给定或默认的容量创建"""
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = FrameTable(name, capacity or self.capacity)
+            return self.tables[name]
+
+    def get_stats(self):
+        with self.lock:
+            return {name: {'rows': len(table), 'columns': len(table.columns)} for name, table in self.tables.items()}
+
+
+default_store = None
+default_lock = threading.Lock()
+
+def get_column_store():
+    """进程级共享的列式存储，首次使用时创建"""
+    global default_store
+    with default_lock:
+        if default_store == None:
+            default_store = ColumnStore()
+        return default_store
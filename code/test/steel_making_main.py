@@ -5,36 +5,53 @@ from models.data_sender import Sender
 from models.mysql_data import MysqlData
 from models.cip_data import CIPData
 from models.steel_fit import SteelFit
+from models.acquisition import AcquisitionEngine
+from utils.statepoint import Statepoint, StatepointBase
+from utils.dispatcher import Dispatcher
 import pymysql
 """钢坯拟合主程序"""
 
 
+# 所有点的状态更新由共享调度器执行，不再每次变化新建线程
+Statepoint.set_default_dispatcher(Dispatcher(workers=8))
+
 # 配置S7连接
 s7_1 = S7Client()
 s7_1.connect("172.16.1.20", 0, 0)
 data_1 = S7data("conf/s7@172.16.1.20.csv")
 data_1.set_S7Client(s7_1)
-data_1.auto_update_group()
 
 s7_2 = S7Client()
 s7_2.connect("172.16.1.21", 0, 0)
 data_2 = S7data("conf/s7@172.16.1.21.csv")
 data_2.set_S7Client(s7_2)
-data_2.auto_update_group()
 
 s7_3 = S7Client()
 s7_3.connect("192.168.1.215", 0, 0)
 data_3 = S7data("conf/s7@192.168.1.215.csv")
 data_3.set_S7Client(s7_3)
-data_3.auto_update_group()
 
 s7_4 = S7Client()
 s7_4.connect("192.168.1.215", 0, 0)
+data_4 = S7data("conf/s7@192.168.1.215.csv")#只用于写入DB420/421
+data_4.set_S7Client(s7_4)
 
 
 # 配置CIP连接
 cip_data = CIPData("192.168.3.100")
-cip_data.start_update()
+for i in range(1, 9):#各段水流量末位持续跳动，变化不超过0.5%时不推送，最长10s推送一次
+    for j in range(1, 6):
+        cip_data.set_deadband(f"5#水流量-{i}流-{j}段", percent=0.5, heartbeat=10)
+
+
+# 配置采集引擎（单事件循环驱动所有S7/CIP端点）
+engine = AcquisitionEngine(max_workers=4)
+StatepointBase.default_clock = engine.clock#状态点、S7/CIP读取时刻与引擎帧时刻使用同一单调时钟，系统时间跳变时样本时间仍递增
+engine.add_s7(data_1, "172.16.1.20")
+engine.add_s7(data_2, "172.16.1.21")
+engine.add_s7(data_3, "192.168.1.215")
+engine.add_cip(cip_data, 0.5)
+engine.start()
 
 
 # 配置MySQL连接池
@@ -77,7 +94,12 @@ sender_2 = Sender(data_2, mysql_pool, logger, "172.16.1.21")
 sender_3 = Sender(data_3, mysql_pool, logger, "192.168.1.215")
 
 # Mysql数据源
-data_mysql = MysqlData(mysql_pool_web, s7_4, logger)
+data_mysql = MysqlData(mysql_pool_web, data_4, logger)
 
 # 钢坯拟合模块
-steel_fit = SteelFit(data_1, data_3, cip_data, sender_1, logger2)
+steel_fit = SteelFit(data_1, data_3, cip_data, sender_1, logger2, history_dir = 'history')
+
+# 采集统计，每5分钟写入一次日志
+for data in (data_1, data_2, data_3):
+    data.set_logger(logger)
+    data.start_stats_logger(300)
@@ -0,0 +1,124 @@
+import sys, os, time, threading, argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from utils.s7data import S7Client, S7data
+from utils.s7pool import S7ConnectionPool
+from models.acquisition import AcquisitionEngine
+from plc_standin import PlcStandin, load_traces
+"""采集性能基准：在本地PLC替身上比较各采集模式的读取次数、延迟分位数、CPU占用与线程数"""
+
+class CountingClient(S7Client):
+    """记录每次snap7读取调用耗时的S7Client"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = []
+        self.latency_lock = threading.Lock()
+
+    def timed(self, func, *args):
+        begin = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            with self.latency_lock:
+                self.latency.append(time.perf_counter() - begin)
+
+    def db_read(self, *args):
+        return self.timed(super().db_read, *args)
+
+    def read_multi_vars(self, *args):
+        return self.timed(super().read_multi_vars, *args)
+
+def connect(port):
+    client = CountingClient()
+    client.connect('127.0.0.1', 0, 1, port)
+    return client
+
+def run_mode(mode, conf, port, duration, frequency, encoding):
+    data = S7data(conf, encoding)
+    if frequency:
+        for nodeinfo in data.nodes.values():
+            nodeinfo['frequency'] = str(frequency)
+    clients = []
+    engine = None
+    if mode == 'pool':
+        pool = S7ConnectionPool('127.0.0.1', 0, 1, size=3, tcp_port=port, client_type=CountingClient)
+        pool.open()
+        clients = pool.sessions
+        data.set_connection_pool(pool)
+    else:
+        clients = [connect(port)]
+        data.set_S7Client(clients[0])
+
+    changes = [0]
+    for name in data.nodes:
+        point = data.make_point(name)
+        point.inject = lambda value, changes=changes: changes.__setitem__(0, changes[0] + 1)
+
+    cpu_begin = time.process_time()
+    begin = time.monotonic()
+    if mode == 'start_auto_update':
+        data.start_auto_update()
+    elif mode in ('auto_update_group', 'pool'):
+        data.auto_update_group()
+    elif mode == 'start_auto_schedule':
+        data.start_auto_schedule()
+    elif mode == 'engine':
+        engine = AcquisitionEngine()
+        engine.add_s7(data)
+        engine.start()
+
+    threads = 0
+    while time.monotonic() - begin < duration:
+        threads = max(threads, threading.active_count())
+        time.sleep(0.05)
+
+    if engine:
+        engine.stop()
+    else:
+        data.end_auto_update()
+    elapsed = time.monotonic() - begin
+    cpu = time.process_time() - cpu_begin
+
+    latency = np.array([i for client in clients for i in client.latency]) * 1000
+    if mode == 'pool':
+        pool.close()
+    else:
+        clients[0].disconnect()
+    return {
+        'mode': mode,
+        'reads/s': len(latency) / elapsed,
+        'p50': np.percentile(latency, 50) if len(latency) else 0.0,
+        'p95': np.percentile(latency, 95) if len(latency) else 0.0,
+        'p99': np.percentile(latency, 99) if len(latency) else 0.0,
+        'cpu%': cpu / elapsed * 100,
+        'threads': threads,
+        'changes/s': changes[0] / elapsed
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='S7采集模式性能基准')
+    parser.add_argument('--conf', default='conf/s7@172.16.1.20.csv')
+    parser.add_argument('--encoding', default='gbk')
+    parser.add_argument('--port', type=int, default=1102)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--frequency', type=int, default=0, help='覆盖CSV中的frequency(ms)，0表示使用配置值')
+    parser.add_argument('--speed', type=float, default=10, help='录制曲线回放倍速')
+    parser.add_argument('--modes', default='start_auto_update,auto_update_group,start_auto_schedule,engine,pool')
+    args = parser.parse_args()
+
+    standin = PlcStandin(args.conf, args.port, args.encoding)
+    traces = load_traces()
+    for index, name in enumerate(standin.nodes):
+        if standin.nodes[name]['type'] in ('real', 'int', 'dint'):
+            standin.set_trace(name, traces[index % len(traces)])
+    standin.start()
+    standin.start_animate(args.speed)
+
+    print(f'{"模式":<22}{"读取/s":>10}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}{"CPU%":>8}{"线程":>6}{"变化/s":>10}')
+    try:
+        for mode in args.modes.split(','):
+            res = run_mode(mode, args.conf, args.port, args.duration, args.frequency, args.encoding)
+            print(f'{res["mode"]:<22}{res["reads/s"]:>10.1f}{res["p50"]:>10.3f}{res["p95"]:>10.3f}{res["p99"]:>10.3f}{res["cpu%"]:>8.1f}{res["threads"]:>6}{res["changes/s"]:>10.1f}')
+    finally:
+        standin.stop()
@@ -0,0 +1,65 @@
+import sys, os, timeit, struct
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import snap7
+from utils.s7decoder import compile_decoder, split_bit_name, BitDecoder
+"""节点解码微基准：逐次字符串比较的旧路径 vs 预编译解码器"""
+
+nodes = {
+    'int': {'name': 'int', 'type': 'int', 'offset': '0', 'size': '2'},
+    'dint': {'name': 'dint', 'type': 'dint', 'offset': '0', 'size': '4'},
+    'real': {'name': 'real', 'type': 'real', 'offset': '0', 'size': '4'},
+    'bool': {'name': 'bool', 'type': 'bool', 'offset': '3', 'size': '1'},
+    'boollist': {'name': 'boollist', 'type': 'boollist', 'offset': '0', 'size': '1'},
+    'string': {'name': 'string', 'type': 'string', 'offset': '0', 'size': '20'},
+}
+node_data = {
+    'int': bytearray(struct.pack('>h', -12)),
+    'dint': bytearray(struct.pack('>i', 1530)),
+    'real': bytearray(struct.pack('>f', 2.75)),
+    'bool': bytearray(b'\x08'),
+    'boollist': bytearray(b'\x05'),
+    'string': bytearray(b'\x12\x0620T512' + bytes(12)),
+}
+
+def legacy_get_value(name):
+    """改造前S7data.get_value的实现"""
+    if len(name) > 3 and name[-3] == '[' and name[-1] == ']' and name[-2].isdigit() and 0 <= int(name[-2]) < 8:
+        index = int(name[-2])
+        name = name[:-3]
+        data = (node_data[name][0] >> index) & 1
+    elif nodes[name]['type'] == 'int':
+        data = snap7.util.get_int(node_data[name], 0)
+    elif nodes[name]['type'] == 'dint':
+        data = snap7.util.get_dint(node_data[name], 0)
+    elif nodes[name]['type'] == 'bool':
+        data = snap7.util.get_bool(node_data[name], 0, int(nodes[name]['offset']))
+    elif nodes[name]['type'] == 'boollist':
+        data = [(node_data[name][0] >> i) & 1 for i in range(8)]
+    elif nodes[name]['type'] == 'real':
+        data = snap7.util.get_real(node_data[name], 0)
+    elif nodes[name]['type'] == 'string':
+        data = node_data[name][2:2+int.from_bytes(node_data[name][1:2])].decode('gbk', errors='replace')
+    else:
+        return None
+    return data
+
+decoders = {name: compile_decoder(info) for name, info in nodes.items()}
+readers = {name: (name, decoders[name]) for name in nodes}
+for i in range(8):
+    node_name, index = split_bit_name(f'boollist[{i}]')
+    readers[f'boollist[{i}]'] = (node_name, BitDecoder(index))
+
+def compiled_get_value(name):
+    node_name, decoder = readers[name]
+    return decoder.decode(node_data[node_name])
+
+names = list(nodes.keys()) + ['boollist[2]']
+for name in names:
+    assert legacy_get_value(name) == compiled_get_value(name), name
+
+number = 200000
+print(f'{"类型":<12}{"旧路径(ns)":>12}{"解码器(ns)":>12}{"加速比":>8}')
+for name in names:
+    old = timeit.timeit(lambda: legacy_get_value(name), number=number) / number * 1e9
+    new = timeit.timeit(lambda: compiled_get_value(name), number=number) / number * 1e9
+    print(f'{name:<12}{old:>12.0f}{new:>12.0f}{old / new:>8.1f}')
@@ -0,0 +1,61 @@
+import sys, os, time, random, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.statepoint import Statepoint, Integration_speed_mpmin
+from utils.replay import ReplayEngine, save_events, load_events
+"""确定性回放基准：合成一个班次的切割信号，回放两次检查结果一致并统计耗时"""
+
+SOURCE = '172.16.1.20'
+
+def make_shift(hours = 8, strands = 8, seed = 1):
+    """每流约2分钟切割一次，切割信号保持5s，上升与下降沿附带抖动；拉速每秒一个值"""
+    rand = random.Random(seed)
+    start = 1700000000.0
+    end = start + hours * 3600
+    events = []
+    for strand in range(1, strands + 1):
+        t = start + rand.uniform(0, 120)
+        while t < end:
+            name = f'{strand}流切割信号'
+            events.append((t, SOURCE, name, True))
+            if rand.random() < 0.3:#保持期间的短暂抖动
+                events.append((t + 2.0, SOURCE, name, False))
+                events.append((t + 2.3, SOURCE, name, True))
+            events.append((t + 5.0, SOURCE, name, False))
+            t += rand.uniform(100, 140)
+    for i in range(int(hours * 3600)):
+        events.append((start + i, SOURCE, '1流拉速', 2.5 + rand.uniform(-0.05, 0.05)))
+    events.sort(key=lambda event: event[0])
+    return start, events
+
+def replay(start, events, strands = 8):
+    engine = ReplayEngine(start)
+    with engine:
+        s7 = engine.source(SOURCE)
+        for strand in range(1, strands + 1):
+            point = s7.make_point(f'{strand}流切割信号', Statepoint)
+            point.set_keep_time(1000)
+        length = s7.make_point('1流拉速', Integration_speed_mpmin)
+        begin = time.perf_counter()
+        transitions = engine.run(events)
+        cost = time.perf_counter() - begin
+    return transitions, length.data, cost
+
+
+if __name__ == "__main__":
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    start, events = make_shift(hours)
+
+    path = os.path.join(tempfile.gettempdir(), 'bench_replay.jsonl')
+    save_events(path, events)
+    assert load_events(path) == events
+
+    first, length1, cost1 = replay(start, events)
+    second, length2, cost2 = replay(start, load_events(path))
+    assert first == second and length1 == length2, '两次回放结果不一致'
+
+    excites = sum(1 for i in first if i[2] == 'excite')
+    print(f'事件数：{len(events)}，excite/reset：{len(first)}（excite {excites}）')
+    print(f'1流积分长度：{length1:.1f}m')
+    print(f'回放{hours}小时耗时：{cost1:.2f}s / {cost2:.2f}s')
+    for i in first[:6]:
+        print(f'  {i[0] - start:>10.2f}s  {i[1]:<24}{i[2]}')
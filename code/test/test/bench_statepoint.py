@@ -0,0 +1,40 @@
+import sys, os, timeit, tracemalloc, gc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.statepoint import Statepoint, CompactStatepoint
+"""状态点内存与构造开销基准：Statepoint vs CompactStatepoint"""
+
+def measure_memory(point_type, count):
+    """创建count个点并返回每个点占用的平均字节数"""
+    gc.collect()
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    points = [point_type() for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    del points
+    return used / count
+
+def measure_construct(point_type, number):
+    return timeit.timeit(point_type, number=number) / number * 1e9
+
+def measure_inject(point_type, number):
+    """不触发状态更新的注入（数据相同时直接返回）"""
+    point = point_type()
+    point.inject(1)
+    return timeit.timeit(lambda: point.inject(1), number=number) / number * 1e9
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    number = 200000
+
+    for point_type in (Statepoint, CompactStatepoint):
+        point = point_type()
+        assert point.inject is not None and point.lock is not None#接口一致性
+
+    print(f'{"类型":<20}{"内存(B/点)":>12}{"构造(ns)":>12}{"注入(ns)":>12}')
+    for point_type in (Statepoint, CompactStatepoint):
+        memory = measure_memory(point_type, count)
+        construct = measure_construct(point_type, number)
+        inject = measure_inject(point_type, number)
+        print(f'{point_type.__name__:<20}{memory:>12.0f}{construct:>12.0f}{inject:>12.0f}')
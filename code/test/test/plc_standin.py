@@ -0,0 +1,126 @@
+import sys, os, csv, ctypes, re, ast, threading, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import snap7
+"""基于snap7.server的PLC替身：按conf/s7@*.csv的布局建立DB镜像，并用录制的曲线驱动数据变化"""
+
+TRACE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'projects', 'p2_cut', 'ref_codes', 'error.txt')
+
+def load_traces(path = TRACE_FILE):
+    """解析error.txt中打印的deque([(value, timestamp), ...])，返回[[(value, timestamp), ...], ...]"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    return [ast.literal_eval(i.group(1)) for i in re.finditer(r'deque\((\[.*?\])', text)]
+
+class PlcStandin:
+    """本地PLC替身，DB大小按CSV中各DB的最大结束地址分配"""
+    def __init__(self, csvfile, tcp_port = 1102, encoding = 'gbk'):
+        self.tcp_port = tcp_port
+        self.nodes = {}
+        self.lock = threading.Lock()
+        self.traces = {}
+        self.thread = None
+        self.thread_run = False
+
+        db_size = {}
+        with open(csvfile, encoding=encoding) as f:
+            for i in csv.DictReader(f):
+                self.nodes[i['name']] = i
+                end = int(i['start']) + int(i['size'])
+                db_size[int(i['db'])] = max(db_size.get(int(i['db']), 0), end)
+
+        self.server = snap7.server.Server(log=False)
+        self.dbs = {}
+        for db, size in db_size.items():
+            self.dbs[db] = (ctypes.c_ubyte * size)()
+            self.server.register_area(snap7.type.SrvArea.DB, db, self.dbs[db])
+
+    def start(self):
+        self.server.start(tcp_port=self.tcp_port)
+
+    def stop(self):
+        self.stop_animate()
+        self.server.stop()
+        self.server.destroy()
+
+    def set_value(self, name, value):
+        """按节点类型将值写入DB镜像"""
+        nodeinfo = self.nodes[name]
+        start = int(nodeinfo['start'])
+        data = bytearray(int(nodeinfo['size']))
+        if nodeinfo['type'] == 'int':
+            snap7.util.set_int(data, 0, int(value))
+        elif nodeinfo['type'] == 'dint':
+            snap7.util.set_dint(data, 0, int(value))
+        elif nodeinfo['type'] == 'real':
+            snap7.util.set_real(data, 0, float(value))
+        elif nodeinfo['type'] == 'bool':
+            data[0] = self.dbs[int(nodeinfo['db'])][start]
+            snap7.util.set_bool(data, 0, int(nodeinfo['offset']), bool(value))
+        elif nodeinfo['type'] == 'boollist':
+            data[0] = sum(1 << i for i in range(8) if value[i]) if isinstance(value, (list, tuple)) else int(value)
+        elif nodeinfo['type'] == 'string':
+            raw = str(value).encode('gbk')[:len(data) - 2]
+            data[0] = len(data) - 2
+            data[1] = len(raw)
+            data[2:2 + len(raw)] = raw
+        else:
+            raise ValueError('暂不支持的类型：' + nodeinfo['type'])
+        with self.lock:
+            ctypes.memmove(ctypes.addressof(self.dbs[int(nodeinfo['db'])]) + start, bytes(data), len(data))
+
+    def set_trace(self, name, trace):
+        """为节点设置录制曲线[(value, timestamp), ...]，回放时按相对时间循环播放"""
+        t0 = trace[0][1]
+        self.traces[name] = [(value, t - t0) for value, t in trace]
+
+    def animate(self, speed = 1.0, interval = 0.01):
+        begin = time.monotonic()
+        positions = {name: 0 for name in self.traces}
+        for name, trace in self.traces.items():
+            self.set_value(name, trace[0][0])
+        while self.thread_run:
+            elapsed = (time.monotonic() - begin) * speed
+            for name, trace in self.traces.items():
+                span = trace[-1][1] or 1
+                offset = elapsed % span
+                index = positions[name]
+                if offset < trace[index][1]:#新一轮循环
+                    index = 0
+                while index + 1 < len(trace) and trace[index + 1][1] <= offset:
+                    index += 1
+                if index != positions[name]:
+                    self.set_value(name, trace[index][0])
+                positions[name] = index
+            time.sleep(interval)
+
+    def start_animate(self, speed = 1.0):
+        """启动回放线程，speed为回放倍速"""
+        if self.thread:
+            return None
+        self.thread_run = True
+        self.thread = threading.Thread(target=self.animate, args=(speed,))
+        self.thread.start()
+
+    def stop_animate(self):
+        self.thread_run = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+
+if __name__ == "__main__":
+    conf = sys.argv[1] if len(sys.argv) > 1 else 'conf/s7@172.16.1.20.csv'
+    standin = PlcStandin(conf)
+    traces = load_traces()
+    for i in range(1, 9):
+        name = f'{i}流结晶器拉速'
+        if name in standin.nodes:
+            standin.set_trace(name, traces[i % len(traces)])
+    standin.start()
+    standin.start_animate(speed=10)
+    print(f'PLC替身已启动：127.0.0.1:{standin.tcp_port}，Ctrl+C退出')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        standin.stop()
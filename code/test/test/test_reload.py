@@ -0,0 +1,139 @@
+import sys, os, time, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from plc_standin import PlcStandin
+from utils.s7data import S7Client, S7data
+from models.acquisition import AcquisitionEngine
+"""配置重新加载后采集端点与调度线程的同步，使用本地snap7替身"""
+
+PORT = 1103
+HEADER = 'name,type,db,start,offset,size,read_allow,write_allow,frequency,group\n'
+ROW_A = 'a,real,1,0,0,4,TRUE,FALSE,{},1\n'
+ROW_B = 'b,real,1,4,0,4,TRUE,FALSE,100,2\n'
+
+def write_conf(path, rows, header = HEADER):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(header + ''.join(rows))
+
+class Recorder:
+    def __init__(self):
+        self.values = []
+
+    def inject(self, data):
+        self.values.append(data)
+
+    def inject_at(self, data, timestamp):
+        self.values.append(data)
+
+def setup(folder):
+    full = os.path.join(folder, 'full.csv')
+    conf = os.path.join(folder, 'conf.csv')
+    write_conf(full, [ROW_A.format(100), ROW_B])
+    write_conf(conf, [ROW_A.format(100)])
+    standin = PlcStandin(full, PORT, 'utf-8')
+    standin.start()
+    client = S7Client()
+    client.connect('127.0.0.1', 0, 1, PORT)
+    data = S7data(conf, encoding='utf-8')
+    data.set_S7Client(client)
+    return standin, client, data, conf
+
+def wait_for(check, timeout = 3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_engine_reload_new_group():
+    with tempfile.TemporaryDirectory() as folder:
+        standin, client, data, conf = setup(folder)
+        engine = AcquisitionEngine()
+        try:
+            engine.add_s7(data, 'plc')
+            engine.start()
+            assert sorted(engine.get_status()) == ['plc#1']
+
+            write_conf(conf, [ROW_A.format(200), ROW_B])
+            result = data.reload()
+            assert result['added'] == ['b']
+            b = Recorder()
+            data.make_point('b', lambda: b)
+            standin.set_value('b', 2.5)
+            assert wait_for(lambda: 2.5 in b.values), '新增组没有被轮询'
+            endpoints = {i.name: i for i in engine.endpoints}
+            assert sorted(endpoints) == ['plc#1', 'plc#2']
+            assert endpoints['plc#1'].period == 0.2
+
+            write_conf(conf, [ROW_A.format(200)])
+            data.reload()
+            assert wait_for(lambda: sorted(engine.get_status()) == ['plc#1'])
+        finally:
+            engine.stop()
+            client.disconnect()
+            standin.stop()
+
+def test_schedule_restarts_when_nodes_return():
+    with tempfile.TemporaryDirectory() as folder:
+        standin, client, data, conf = setup(folder)
+        try:
+            write_conf(conf, [ROW_A.format(100).replace('TRUE,FALSE', 'FALSE,FALSE')])
+            data.reload()
+            data.start_auto_schedule()
+            assert wait_for(lambda: not data.schedule_thread.is_alive()), '没有可读节点时调度线程应退出'
+
+            write_conf(conf, [ROW_A.format(100)])
+            data.reload()
+            a = Recorder()
+            data.make_point('a', lambda: a)
+            standin.set_value('a', 1.5)
+            assert wait_for(lambda: 1.5 in a.values), '可读节点恢复后调度线程没有重启'
+        finally:
+            data.end_auto_update()
+            client.disconnect()
+            standin.stop()
+
+def test_removed_node_state_cleared():
+    header = HEADER.rstrip('\n') + ',deadband_abs,deadband_pct,heartbeat\n'
+    rows = ['a,real,1,0,0,4,TRUE,FALSE,100,1,1.0,,\n', 'c,boollist,1,8,0,1,TRUE,FALSE,100,1,,,\n', 'b,real,1,4,0,4,TRUE,FALSE,100,2,,,\n']
+    with tempfile.TemporaryDirectory() as folder:
+        conf = os.path.join(folder, 'conf.csv')
+        write_conf(conf, rows, header)
+        standin = PlcStandin(conf, PORT, 'utf-8')
+        standin.start()
+        client = S7Client()
+        client.connect('127.0.0.1', 0, 1, PORT)
+        data = S7data(conf, encoding='utf-8')
+        data.set_S7Client(client)
+        try:
+            a = Recorder()
+            data.make_point('a', lambda: a)
+            data.make_point('c[0]', Recorder)
+            standin.set_value('a', 5.0)
+            standin.set_value('c', 1)
+            data.poll_group('1')
+            standin.set_value('a', 5.5)#被死区抑制，等待心跳推送
+            data.poll_group('1')
+            assert 'a' in data.deadband_pending and 'c' in data.bit_state
+
+            write_conf(conf, rows[2:], header)
+            assert sorted(data.reload()['removed']) == ['a', 'c']
+            tables = (data.deadbands, data.deadband_pending, data.delivered, data.bit_masks,
+                      data.bit_state, data.send_stats, data.node_read_stats)
+            assert not any(name in table for table in tables for name in ('a', 'c'))
+            assert 'a' not in data.stats()['nodes']
+            count = len(a.values)
+            data.flush_deadband(('a',), 0.0, 1e12)
+            data.poll_group('2')
+            assert len(a.values) == count
+        finally:
+            client.disconnect()
+            standin.stop()
+
+
+if __name__ == "__main__":
+    test_engine_reload_new_group()
+    test_schedule_restarts_when_nodes_return()
+    test_removed_node_state_cleared()
+    print('ok')
@@ -0,0 +1,66 @@
+import sys, os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.statepoint import Statepoint, Through_state_separation2, Through_state_continues3
+from utils.sequence import Sequence, SequenceStep
+from utils.replay import ReplayEngine
+"""Sequence与Through_state_*在同一输入下的触发结果对照，在回放引擎中同步执行"""
+
+def run_baseline(point_type, count, inputs):
+    events = []
+    with ReplayEngine(100.0):
+        points = [Statepoint() for i in range(count)]
+        for point in points:
+            point.set_keep_time(0)
+        target = point_type(*points)
+        target.set_keep_time(0)
+        target.set_excite_action(lambda: events.append('E'))
+        target.set_reset_action(lambda: events.append('R'))
+        target.allow_update()
+        for index, value in inputs:
+            points[index].inject(value)
+    return events
+
+def run_sequence(reset, count, inputs):
+    events = []
+    sequence = Sequence([SequenceStep(str(i)) for i in range(count)], reset)
+    sequence.set_excite_action(lambda: events.append('E'))
+    sequence.set_reset_action(lambda: events.append('R'))
+    for index, value in inputs:
+        sequence.feed(index, value)
+    return events
+
+def test_in_order():
+    inputs = [(0, 1), (1, 1), (1, 0), (0, 0)]
+    assert run_sequence('last', 2, inputs) == run_baseline(Through_state_separation2, 2, inputs) == ['E', 'R']
+
+def test_later_step_active_first():
+    """后一步先触发、前一步后触发时，前一步触发即推进到完成"""
+    inputs = [(1, 1), (0, 1)]
+    assert run_baseline(Through_state_separation2, 2, inputs) == ['E']
+    assert run_sequence('last', 2, inputs) == ['E']
+
+def test_later_steps_active_first_three():
+    inputs = [(2, 1), (0, 1), (1, 1)]
+    assert run_baseline(Through_state_continues3, 3, inputs) == ['E']
+    assert run_sequence('all', 3, inputs) == ['E']
+
+def test_restart_with_first_step_active():
+    """最后一步复位时第一步仍触发，复位后从仍触发的步继续，最后一步再次触发即完成"""
+    inputs = [(0, 1), (1, 1), (1, 0), (1, 1)]
+    assert run_baseline(Through_state_separation2, 2, inputs) == ['E', 'R', 'E']
+    assert run_sequence('last', 2, inputs) == ['E', 'R', 'E']
+
+def test_all_reset_rule():
+    """第二步先复位、第一步仍触发时，最后一步复位即输出复位"""
+    inputs = [(0, 1), (1, 1), (2, 1), (1, 0), (2, 0)]
+    assert run_baseline(Through_state_continues3, 3, inputs) == ['E', 'R']
+    assert run_sequence('all', 3, inputs) == ['E', 'R']
+
+
+if __name__ == "__main__":
+    test_in_order()
+    test_later_step_active_first()
+    test_later_steps_active_first_three()
+    test_restart_with_first_step_active()
+    test_all_reset_rule()
+    print('ok')
@@ -0,0 +1,42 @@
+class Deadband:
+    """采集端死区过滤
+    相对上一次推送的值，变化量不超过max(absolute, |上次值|*percent/100)时不推送，
+    被抑制的值最迟在上一次推送heartbeat秒后推送，heartbeat为0表示不设心跳。
+    """
+    def __init__(self, absolute = 0.0, percent = 0.0, heartbeat = 0.0):
+        self.absolute = absolute
+        self.percent = percent
+        self.heartbeat = heartbeat
+        self.last = None        #上一次推送的值
+        self.last_time = None   #上一次推送的单调时钟时刻(s)
+        self.pending = False    #是否有被抑制、尚未推送的值
+        self.suppressed = 0
+
+    def due(self, now):
+        """被抑制的值是否已到心跳时刻"""
+        return self.pending and self.heartbeat > 0 and now - self.last_time >= self.heartbeat
+
+    def check(self, value, now):
+        """判断value是否需要推送，需要推送时记为最近一次推送的值"""
+        if self.last == None or abs(value - self.last) > max(self.absolute, abs(self.last) * self.percent / 100) or self.due(now):
+            self.last = value
+            self.last_time = now
+            self.pending = False
+            return True
+        self.pending = True
+        self.suppressed += 1
+        return False
+
+
+def make_deadband(nodeinfo: dict):
+    """按S7配置中的可选列deadband_abs(绝对值)、deadband_pct(%)、heartbeat(ms)创建死区，
+    未配置或非数值类型返回None
+    """
+    if nodeinfo.get('type') not in ('int', 'dint', 'real'):
+        return None
+    absolute = float(nodeinfo.get('deadband_abs') or 0)
+    percent = float(nodeinfo.get('deadband_pct') or 0)
+    heartbeat = float(nodeinfo.get('heartbeat') or 0) / 1000
+    if absolute <= 0 and percent <= 0:
+        return None
+    return Deadband(absolute, percent, heartbeat)
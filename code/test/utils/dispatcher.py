@@ -0,0 +1,69 @@
+from collections import deque
+import threading, queue, warnings, traceback
+
+class Dispatcher:
+    """共享的状态更新调度器
+    固定数量的工作线程执行所有提交的任务，同一个key（通常是点对象）的任务按提交顺序串行执行，
+    不同key之间并行，用于替代每次数据变化都新建线程的做法。
+    """
+    def __init__(self, workers = 4, logger = None):
+        self.workers = workers
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.pending = {}   #key -> 待执行任务队列，key在字典中表示已有线程负责或已排队
+        self.ready = queue.SimpleQueue()
+        self.threads = []
+        self.executed = 0
+        self.errors = 0
+
+    def start(self):
+        if self.threads:
+            return None
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work, daemon=True, name=f'dispatcher-{i}')
+            self.threads.append(thread)
+            thread.start()
+
+    def stop(self):
+        """等待已提交的任务执行完后停止工作线程"""
+        for i in self.threads:
+            self.ready.put(None)
+        for i in self.threads:
+            i.join()
+        self.threads = []
+
+    def submit(self, key, func):
+        """提交任务，同一key的任务串行执行"""
+        with self.lock:
+            tasks = self.pending.get(key)
+            if tasks == None:
+                self.pending[key] = deque((func,))
+                self.ready.put(key)
+            else:
+                tasks.append(func)
+
+    def work(self):
+        while True:
+            key = self.ready.get()
+            if key == None:
+                return None
+            while True:
+                with self.lock:
+                    tasks = self.pending[key]
+                    if not tasks:#该key的任务已全部执行
+                        del self.pending[key]
+                        break
+                    func = tasks.popleft()
+                try:
+                    func()
+                except Exception as reason:
+                    self.errors += 1
+                    warnings.warn(f'状态更新任务异常：{reason}')
+                    if self.logger:
+                        self.logger.error(f'状态更新任务异常：{reason}\n{traceback.format_exc()}')
+                self.executed += 1
+
+    def get_stats(self):
+        with self.lock:
+            backlog = sum(len(i) for i in self.pending.values())
+            return {'workers': len(self.threads), 'keys': len(self.pending), 'backlog': backlog, 'executed': self.executed, 'errors': self.errors}
@@ -1,6 +1,7 @@
 import paho.mqtt.client as mqtt
 import json, warnings
 from utils.statepoint import *
+from utils.timerwheel import get_timer_wheel
 
 class MqttClient(mqtt.Client):
     def __init__(self, client_id, username=None, password=None, version=mqtt.CallbackAPIVersion.VERSION2):
@@ -36,8 +37,7 @@ class Mqttdata:
         if name in self.target_from_name:
             for i in self.target_from_name[name]:
                 i.inject(self.node_data[name])
-                timer = threading.Timer(5, lambda i=i: i.set_state(False))
-                timer.start()
+                get_timer_wheel().schedule(5, lambda i=i: i.set_state(False))
         
     def on_subscribe(self, client, userdata, mid, reason_code_list, properties):
         if reason_code_list[0].is_failure:
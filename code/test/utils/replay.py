@@ -0,0 +1,300 @@
+from collections import deque
+from utils.statepoint import Statepoint, StatepointBase, point_time
+from utils.s7decoder import split_bit_name
+from utils.timerwheel import TimerWheel
+import threading, json, warnings, traceback
+"""确定性回放：按记录的带时间戳事件在虚拟时钟上同步驱动状态点图，记录每次excite/reset的虚拟时刻"""
+
+class Gap:
+    """事件日志中的数据缺口记录，对应点的mark_gap(start, end)"""
+    __slots__ = ('end',)
+
+    def __init__(self, end = None):
+        self.end = end
+
+    def __eq__(self, other):
+        return isinstance(other, Gap) and other.end == self.end
+
+    def __repr__(self):
+        return f'Gap({self.end})'
+
+
+class EventRecorder:
+    """采集层事件录制：作为订阅点挂到S7data/CIPData上，记录(时间戳, 数据源, 名称, 值)"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+
+    def point_type(self, source, name):
+        recorder = self
+
+        class RecordPoint:
+            __slots__ = ()
+
+            def __init__(self, initvalue = None, *args):
+                pass
+
+            def inject(self, data):
+                recorder.record(point_time(), source, name, data)
+
+            def inject_at(self, data, timestamp):
+                recorder.record(timestamp, source, name, data)
+
+            def mark_gap(self, start, end = None):
+                recorder.record(start, source, name, Gap(end))
+
+        return RecordPoint
+
+    def attach(self, data_source, source: str, names = None):
+        """录制data_source中names(默认全部)的推送，source为回放时对应的数据源名称"""
+        if names == None:
+            if hasattr(data_source, 'nodes'):#S7data
+                names = [i for i in data_source.nodes if data_source.nodes[i]['read_allow'].upper() != 'FALSE']
+            else:#CIPData
+                names = list(data_source.name2value)
+        for name in names:
+            data_source.make_point(name, self.point_type(source, name))
+
+    def record(self, timestamp, source, name, value):
+        with self.lock:
+            self.events.append((timestamp, source, name, value))
+
+    def save(self, path):
+        with self.lock:
+            events = list(self.events)
+        save_events(path, events)
+
+
+def save_events(path, events):
+    """按行保存为json"""
+    with open(path, 'w', encoding='utf-8') as file:
+        for timestamp, source, name, value in events:
+            record = {'t': timestamp, 'source': source, 'name': name}
+            if isinstance(value, Gap):
+                record['gap'] = value.end
+            else:
+                record['value'] = value
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def load_events(path):
+    events = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            value = Gap(record['gap']) if 'gap' in record else record['value']
+            events.append((record['t'], record['source'], record['name'], value))
+    return events
+
+
+class VirtualClock:
+    """回放用时钟，时间只由回放引擎推进"""
+    def __init__(self, now = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def set(self, now):
+        if now > self.now:
+            self.now = now
+
+
+class InlineDispatcher:
+    """同步调度器，接口与Dispatcher一致
+    提交的任务在提交线程中按先进先出顺序立即执行；任务执行中再提交的任务排在队尾，
+    当前任务返回后再执行，避免同一个点重入，保证回放结果确定。
+    """
+    def __init__(self, logger = None):
+        self.logger = logger
+        self.tasks = deque()
+        self.running = False
+        self.executed = 0
+        self.errors = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def submit(self, key, func):
+        self.tasks.append(func)
+        if self.running:
+            return None
+        self.running = True
+        try:
+            while self.tasks:
+                func = self.tasks.popleft()
+                try:
+                    func()
+                except Exception as reason:
+                    self.errors += 1
+                    warnings.warn(f'状态更新任务异常：{reason}')
+                    if self.logger:
+                        self.logger.error(f'状态更新任务异常：{reason}\n{traceback.format_exc()}')
+                self.executed += 1
+        finally:
+            self.running = False
+
+    def get_stats(self):
+        return {'workers': 0, 'keys': 0, 'backlog': len(self.tasks), 'executed': self.executed, 'errors': self.errors}
+
+
+class ReplaySource:
+    """回放数据源，make_point接口与S7data/CIPData一致，用于代替真实数据源搭建待回放的点图
+    style为被代替的数据源类型：'s7'时point_type()无参构造，'cip'时以当前值point_type(value)构造
+    """
+    def __init__(self, engine, name, style = 's7'):
+        if style not in ('s7', 'cip'):
+            raise ValueError(f'不支持的数据源类型：{style}')
+        self.engine = engine
+        self.name = name
+        self.style = style
+        self.values = {}
+        self.points = {}        #名称 -> [点]
+        self.bit_points = {}    #名称 -> {位序号: [点]}
+
+    def make_point(self, name, point_type = Statepoint):
+        node, index = split_bit_name(name)
+        if self.style == 'cip':
+            point = point_type(self.values.get(node))
+        else:
+            point = point_type()
+        if index == -1:
+            self.points.setdefault(node, []).append(point)
+        else:
+            self.bit_points.setdefault(node, {}).setdefault(index, []).append(point)
+        self.engine.watch(point, f'{self.name}/{name}')
+        if self.style == 's7' and node in self.values:#S7data创建后注入当前值，CIPData在构造时传入
+            value = self.values[node]
+            point.inject(value if index == -1 else self.bit(value, index))
+        return point
+
+    @staticmethod
+    def bit(value, index):
+        if isinstance(value, (list, tuple)):
+            return int(bool(value[index]))
+        return (int(value) >> index) & 1
+
+    def deliver(self, name, value, timestamp):
+        """按采集层的语义推送：整值推给所有订阅点，位订阅只推送发生变化的位"""
+        if isinstance(value, Gap):
+            for point in self.points.get(name, ()):
+                point.mark_gap(timestamp, value.end)
+            for points in self.bit_points.get(name, {}).values():
+                for point in points:
+                    point.mark_gap(timestamp, value.end)
+            return None
+        old = self.values.get(name)
+        self.values[name] = value
+        for point in self.points.get(name, ()):
+            point.inject_at(value, timestamp)
+        for index, points in self.bit_points.get(name, {}).items():
+            bit = self.bit(value, index)
+            if old != None and self.bit(old, index) == bit:
+                continue
+            for point in points:
+                point.inject_at(bit, timestamp)
+
+
+class ReplayEngine:
+    """确定性回放引擎
+    回放期间把状态点的默认调度器、时间轮、时钟替换为同步调度器、虚拟时间轮与虚拟时钟，
+    按时间顺序逐条推送事件：推送前先把虚拟时钟推进到事件时刻并依次执行期间到期的定时任务(keep_time防抖、延时计算等)，
+    所有状态更新在调用线程中同步完成，不等待真实时间，相同输入必然得到相同的excite/reset序列。
+    start为回放起始时刻，应不晚于第一条事件，点图创建时读取的时钟即为该时刻。
+    用法：
+        events = load_events(path)
+        engine = ReplayEngine(events[0][0])
+        engine.activate()
+        s7 = engine.source('172.16.1.20')
+        point = s7.make_point('1流切割信号')
+        ...搭建点图，派生点可用engine.watch(point, name)命名...
+        transitions = engine.run(events)
+        engine.deactivate()
+    """
+    def __init__(self, start = None, tick = 0.01, logger = None):
+        self.clock = VirtualClock(start if start != None else 0.0)
+        self.wheel = TimerWheel(tick, clock=self.clock, logger=logger)
+        self.dispatcher = InlineDispatcher(logger)
+        self.logger = logger
+        self.sources = {}
+        self.names = {}         #id(点) -> 名称
+        self.watched = []       #保持被命名点的引用，避免id复用
+        self.transitions = []   #[(虚拟时刻, 名称, 'excite' | 'reset')]
+        self.saved = None
+
+    def source(self, name, style = 's7'):
+        """名称对应的回放数据源，style同ReplaySource"""
+        if name not in self.sources:
+            self.sources[name] = ReplaySource(self, name, style)
+        return self.sources[name]
+
+    def watch(self, point, name):
+        """为点命名，其excite/reset以该名称记录；未命名的点以类型名记录"""
+        self.names[id(point)] = name
+        self.watched.append(point)
+        return point
+
+    def on_transition(self, point, kind):
+        name = self.names.get(id(point))
+        if name == None:
+            name = type(point).__name__
+        self.transitions.append((self.clock.now, name, kind))
+
+    def activate(self):
+        """替换状态点的全局调度器、时间轮、时钟；搭建点图前调用，使创建时读取时钟的点也使用虚拟时间"""
+        if self.saved != None:
+            return None
+        self.saved = (StatepointBase.default_dispatcher, StatepointBase.default_timer_wheel,
+                      StatepointBase.default_clock, StatepointBase.transition_hook)
+        StatepointBase.default_dispatcher = self.dispatcher
+        StatepointBase.default_timer_wheel = self.wheel
+        StatepointBase.default_clock = self.clock
+        StatepointBase.transition_hook = self.on_transition
+
+    def deactivate(self):
+        if self.saved == None:
+            return None
+        (StatepointBase.default_dispatcher, StatepointBase.default_timer_wheel,
+         StatepointBase.default_clock, StatepointBase.transition_hook) = self.saved
+        self.saved = None
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, *args):
+        self.deactivate()
+
+    def advance(self, now):
+        """把虚拟时钟推进到now，到期任务按到期时刻依次执行，执行时时钟为任务的到期时刻"""
+        while True:
+            deadline = self.wheel.next_deadline()
+            if deadline == None or deadline > now:
+                break
+            self.clock.set(deadline)
+            self.wheel.advance(deadline + self.wheel.tick / 2)#按格取整时避免浮点误差落到前一格
+        self.clock.set(now)
+
+    def run(self, events, tail = 60.0):
+        """按时间顺序回放events[(时间戳, 数据源, 名称, 值)]，最后再推进tail(s)执行尚未到期的任务，返回本次记录的excite/reset"""
+        events = sorted(events, key=lambda event: event[0])#稳定排序，同一时刻保持记录顺序
+        begin = len(self.transitions)
+        active = self.saved == None
+        if active:
+            self.activate()
+        try:
+            for timestamp, source, name, value in events:
+                self.advance(timestamp)
+                target = self.sources.get(source)
+                if target != None:
+                    target.deliver(name, value, timestamp)
+            if tail > 0:
+                self.advance(self.clock.now + tail)
+        finally:
+            if active:
+                self.deactivate()
+        return self.transitions[begin:]
@@ -1,5 +1,9 @@
-import snap7, csv, threading, warnings, time, ctypes
+import snap7, csv, threading, warnings, time, ctypes, heapq, os
 from utils.statepoint import *
+from utils.s7plan import ReadPlan, WritePlan
+from utils.s7stats import ReadStats, LatencyHistogram
+from utils.deadband import make_deadband
+from utils.s7decoder import compile_decoder, split_bit_name, BitDecoder, BoolListDecoder
 
 class TS7DataItem(ctypes.Structure):
     _fields_ = [
@@ -12,7 +16,83 @@ class TS7DataItem(ctypes.Structure):
         ('pdata', ctypes.c_void_p)
     ]
 
+class S7MultiRead:
+    """预分配的多组读取：ctypes缓冲区与TS7DataItem数组只创建一次，之后每次读取复用，稳态读取不再分配内存"""
+    def __init__(self, db_number: list, start: list, size: list):
+        self.count = len(size)
+        self.size = [int(i) for i in size]
+        array_type = TS7DataItem * self.count
+        self.items = array_type(*[TS7DataItem(snap7.type.Areas.DB, snap7.type.WordLen.Byte, 0, int(db_number[i]), int(start[i]), self.size[i], None)
+                                  for i in range(self.count)])
+        self.target = None
+        self.storage = None
+        self.views = []
+        self.bind(bytearray(sum(self.size)))
+
+    def bind(self, target: bytearray, offsets: list | None = None):
+        """将各项的读取结果直接指向target中的偏移位置（默认依次紧密排布）"""
+        if offsets == None:
+            offsets = []
+            pos = 0
+            for i in self.size:
+                offsets.append(pos)
+                pos += i
+        for i in range(self.count):
+            if offsets[i] < 0 or offsets[i] + self.size[i] > len(target):
+                raise ValueError("目标缓冲区长度不足")
+
+        self.storage = (ctypes.c_char * len(target)).from_buffer(target)
+        address = ctypes.addressof(self.storage)
+        for i in range(self.count):
+            self.items[i].pdata = address + offsets[i]
+        view = memoryview(target).toreadonly()
+        self.views = [view[offsets[i]:offsets[i] + self.size[i]] for i in range(self.count)]
+        self.target = target
+
+    def read(self, client: snap7.client.Client):
+        """执行读取，返回各项结果的只读memoryview（每次返回同一组视图，内容随读取更新）"""
+        result = client.read_multi_vars(self.items)
+        if result[0]:
+            raise RuntimeError("多组读取失败")
+        return self.views
+
+    def read_into(self, client: snap7.client.Client, target: bytearray, offsets: list | None = None):
+        """执行读取，结果填入调用方提供的bytearray"""
+        if target is not self.target or offsets != None:
+            self.bind(target, offsets)
+        self.read(client)
+        return target
+
 class S7Client(snap7.client.Client):
+    def connect(self, address, rack, slot, tcp_port = 102, retry: bool = True, retry_times: int = 10, max_stay: int = 300):
+        self.connect_args = (address, rack, slot, tcp_port)
+        if bool(retry) == False:#不进行重试
+            return super().connect(address, rack, slot, tcp_port)
+        
+        stay = 1#重试间隔   
+        while retry_times == 0 or retry_times > 1:
+            try:
+                return super().connect(address, rack, slot, tcp_port)
+            except RuntimeError:
+                if retry_times > 1:
+                    retry_times -= 1#--重试次数
+                time.sleep(stay)
+                stay *= 2#指数退避策略
+                if stay > max_stay:#限制最大重试间隔
+                    stay = max_stay
+        
+        return super().connect(address, rack, slot, tcp_port)
+
+    def reconnect(self):
+        """按最近一次connect的参数重新连接一次，失败时抛出RuntimeError"""
+        if not hasattr(self, 'connect_args'):
+            raise RuntimeError('S7Client尚未连接过，无法重连')
+        try:
+            self.disconnect()
+        except RuntimeError:
+            pass
+        return self.connect(*self.connect_args, retry=False)
+
     def multi_db_read_py(self, db_number: list, start: list, size: list):
         count = len(size)
         buffers = [ctypes.create_string_buffer(i) for i in size]
@@ -29,120 +109,521 @@ class S7Client(snap7.client.Client):
         res_rtn = [bytearray(i) for i in buffers]
         return res_rtn
 
+    def multi_db_write_py(self, db_number: list, start: list, data: list):
+        """一次性写入多个DB块的不同区域"""
+        count = len(data)
+        buffers = [(ctypes.c_char * len(i)).from_buffer_copy(i) for i in data]
+        params = []
+        for i in range(count):
+            params.append(TS7DataItem(snap7.type.Areas.DB, snap7.type.WordLen.Byte, 0, db_number[i], start[i], len(data[i]), ctypes.cast(buffers[i], ctypes.c_void_p)))
+
+        result = self.write_multi_vars(params)
+        if result:
+            raise RuntimeError("多组写入失败")
+
+    def prepare_multi_db_read(self, db_number: list, start: list, size: list):
+        """创建可复用的多组读取对象，用于周期性读取相同的区域"""
+        return S7MultiRead(db_number, start, size)
+
 class S7data:
-    def __init__(self, csvfile):
+    def __init__(self, csvfile, encoding = None):
         self.logger = None
 
         self.S7Client = None
+        self.pool = None
         self.lock = threading.Lock()
         self.thread_run = False
         self.threads = []
         self.nodes = {}
         self.node_data = {}
         self.groups = {}
+        self.plans = {}
+        self.decoders = {}  #节点名 -> 预编译的解码器
+        self.readers = {}   #get_value名称(含name[i]) -> (节点名, 解码器)
+        self.pdu_size = 240
+        self.jitter = {}
+        self.group_stats = {}
+        self.last_frame = {}    #组名 -> 最近一次读取的采集时刻（由外部调度器提供）
+        self.response_smoothing = 0.2   #响应时间滑动平均系数
+        self.adaptive_ratio = 2         #自适应模式下周期至少为平均响应时间的倍数
+        self.written = {}   #(db, 地址) -> 最近一次写入的字节
+        self.write_lock = threading.Lock()
         self.target_from_name = {}
-        with open(csvfile) as f:
+        self.deadbands = {}         #节点名 -> Deadband，只包含配置了死区的数值节点
+        self.deadband_pending = {}  #被死区抑制、等待心跳推送的节点名 -> Deadband
+        self.delivered = {}         #配置了死区的节点名 -> 最近一次推送的字节，get_value返回该值（同CIPData.name2value）
+        self.bit_masks = {}     #boollist节点名 -> 有订阅的位掩码
+        self.bit_state = {}     #boollist节点名 -> 最近一次推送的字节
+        self.csvfile = csvfile
+        self.encoding = encoding
+        self.update_mode = None     #当前的自动读取方式：'node'、'group'或'schedule'
+        self.update_args = ()
+        self.node_threads = {}      #节点名 -> 逐点读取线程
+        self.group_threads = {}     #组名 -> 按组读取线程
+        self.schedule_plans = {}    #调度模式下同时到期的频率组合 -> 合并读取计划
+        self.schedule_thread = None
+        self.reload_listeners = []  #重新加载后调用的函数，参数为reload的返回值，供外部调度器同步端点
+        self.config_lock = threading.Lock()
+        self.config_version = 0
+        self.watch_thread = None
+        self.watch_run = False
+        self.node_read_stats = {}   #逐点读取模式下 节点名 -> ReadStats
+        self.send_stats = {}        #节点名 -> [变化次数, send累计耗时(s), send最大耗时(s)]
+        self.stats_thread = None
+        self.stats_run = False
+        self.reconnect_lock = threading.Lock()
+        self.reconnect_initial = 1      #重连间隔初值(s)，每次失败后加倍
+        self.reconnect_max_stay = 300   #重连间隔上限(s)
+        self.reconnect_stay = self.reconnect_initial
+        self.next_attempt = 0.0
+        self.down_since = None      #连接中断的单调时钟时刻，连接正常时为None
+        self.gap_start = None       #当前中断的数据缺口起点（最近一次成功读取的时间戳）
+        self.last_good = None       #最近一次成功读取的时间戳(s)
+        self.outages = 0
+        self.downtime = 0.0
+        self.last_outage = 0.0
+        nodes, groups = self.read_config(csvfile, encoding)
+        for name, nodeinfo in nodes.items():
+            self.load_node(nodeinfo)
+        self.groups = groups
+        for group in self.groups.keys():
+            self.plans[group] = self.make_plan(self.groups[group])
+
+    @staticmethod
+    def read_config(csvfile, encoding = None):
+        """读取CSV配置，返回({name: nodeinfo}, {group: [name, ...]})
+        除基本列外可选deadband_abs(绝对死区)、deadband_pct(相对死区%)、heartbeat(最长静默ms)列，留空表示不过滤
+        """
+        nodes = {}
+        groups = {}
+        with open(csvfile, encoding=encoding) as f:
             for i in csv.DictReader(f):
-                if i['name'] in self.nodes:
+                if i['name'] in nodes:
                     raise Exception(f"S7配置文件节点名称重复：{i['name']}")
+                nodes[i['name']] = i
+                if i['group'] not in groups:
+                    groups[i['group']] = []
+                groups[i['group']].append(i['name'])
+        return nodes, groups
+
+    def load_node(self, nodeinfo):
+        name = nodeinfo['name']
+        self.nodes[name] = nodeinfo
+        self.node_data[name] = bytearray(int(nodeinfo['size']))
+        self.decoders[name] = compile_decoder(nodeinfo)
+        self.readers[name] = (name, self.decoders[name])
+        self.load_deadband(nodeinfo)
+        self.bit_state.pop(name, None)
+        self.bit_masks.pop(name, None)
+        self.send_stats.pop(name, None)
+        if isinstance(self.decoders[name], BoolListDecoder):#预编译name[i]的位读取，并恢复已有订阅的位掩码
+            for i in range(8):
+                self.readers[f'{name}[{i}]'] = (name, BitDecoder(i))
+            targets = self.target_from_name.get(name + '*')
+            if targets:
+                mask = sum(1 << i for i in range(8) if targets[i])
+                if mask:
+                    self.bit_masks[name] = mask
+
+    def load_deadband(self, nodeinfo):
+        name = nodeinfo['name']
+        self.deadband_pending.pop(name, None)
+        deadband = make_deadband(nodeinfo)
+        if deadband == None:
+            self.deadbands.pop(name, None)
+            self.delivered.pop(name, None)
+        else:
+            self.deadbands[name] = deadband
+            self.delivered[name] = bytes(self.node_data[name])
+
+    def reload(self, csvfile = None, encoding = None):
+        """重新加载CSV配置而不停止采集
+        与当前配置逐行比较，只重建受影响组的读取计划；地址与类型未变的节点保留原有数据，
+        已创建的点与target_from_name中的订阅全部原样保留，被删除的节点重新加入配置后继续推送。
+        返回{'added': [...], 'removed': [...], 'modified': [...], 'groups': [...]}
+        """
+        if csvfile != None:
+            self.csvfile = csvfile
+        if encoding != None:
+            self.encoding = encoding
+        nodes, groups = self.read_config(self.csvfile, self.encoding)
+
+        added = [name for name in nodes if name not in self.nodes]
+        removed = [name for name in self.nodes if name not in nodes]
+        modified = [name for name in nodes if name in self.nodes and nodes[name] != self.nodes[name]]
+        affected = set(group for group in groups if groups[group] != self.groups.get(group))
+        affected.update(group for group in self.groups if group not in groups)
+        affected.update(nodes[name]['group'] for name in added + modified)
+        affected.update(self.nodes[name]['group'] for name in removed + modified)
+        if not affected:
+            return {'added': [], 'removed': [], 'modified': [], 'groups': []}
+
+        with self.config_lock:
+            for name in added:
+                self.load_node(nodes[name])
+            for name in modified:
+                old = self.nodes[name]
+                if any(old[key] != nodes[name][key] for key in ('type', 'db', 'start', 'offset', 'size')):
+                    self.load_node(nodes[name])
+                else:
+                    self.nodes[name] = nodes[name]
+                    self.load_deadband(nodes[name])
+            self.groups = groups
+            for plan in self.schedule_plans.values():#调度模式的合并计划全部作废，由调度线程按新配置重建
+                plan.retired = True
+            self.schedule_plans = {}
+            for group in affected:
+                if group in self.plans:
+                    self.plans[group].retired = True
+                if group in groups:
+                    self.plans[group] = self.make_plan(groups[group])
                 else:
-                    self.nodes[i['name']] = i
-                    self.node_data[i['name']] = bytearray(int(i['size']))
-                    if i['group'] not in self.groups:
-                        self.groups[i['group']] = []
-                    self.groups[i['group']].append(i['name'])
+                    del self.plans[group]
+                    self.group_stats.pop(group, None)
+                    self.last_frame.pop(group, None)
+            for name in removed:#按节点名保存的状态全部清除，订阅(target_from_name)保留
+                del self.nodes[name]
+                del self.node_data[name]
+                del self.decoders[name]
+                del self.readers[name]
+                for table in (self.jitter, self.deadbands, self.deadband_pending, self.delivered, self.bit_masks,
+                              self.bit_state, self.send_stats, self.node_read_stats):
+                    table.pop(name, None)
+            for name in [i for i, reader in self.readers.items() if reader[0] in removed]:
+                del self.readers[name]
+            self.config_version += 1
+
+        if self.thread_run:
+            self.start_reloaded_threads(added + modified, affected)
+        if self.logger:
+            self.logger.info(f'S7配置已重新加载：新增{len(added)}，删除{len(removed)}，修改{len(modified)}，重建组{sorted(affected)}')
+        result = {'added': added, 'removed': removed, 'modified': modified, 'groups': sorted(affected)}
+        for func in list(self.reload_listeners):
+            try:
+                func(result)
+            except Exception as reason:
+                warnings.warn(f'配置重新加载通知失败：{reason}')
+                if self.logger:
+                    self.logger.error(f'配置重新加载通知失败：{reason}')
+        return result
+
+    def add_reload_listener(self, func):
+        """注册重新加载后的回调func(result)"""
+        if not callable(func):
+            raise TypeError('The parameter func can only be a function')
+        self.reload_listeners.append(func)
+
+    def start_reloaded_threads(self, names, groups):
+        """为重新加载后新出现的可读节点或组补充读取线程，调度模式由调度线程自行重建"""
+        if self.update_mode == 'node':
+            for name in names:
+                thread = self.node_threads.get(name)
+                if self.nodes[name]['read_allow'].upper() != 'FALSE' and (thread == None or not thread.is_alive()):
+                    self.node_threads[name] = threading.Thread(target=self.update, args=(name,))
+                    self.threads.append(self.node_threads[name])
+                    self.node_threads[name].start()
+        elif self.update_mode == 'group':
+            for group in groups:
+                thread = self.group_threads.get(group)
+                if group in self.plans and self.plans[group].requests and (thread == None or not thread.is_alive()):
+                    self.group_threads[group] = threading.Thread(target=self.update_group, args=(group, *self.update_args))
+                    self.threads.append(self.group_threads[group])
+                    self.group_threads[group].start()
+        elif self.update_mode == 'schedule':#调度线程在没有可读节点时退出，可读节点重新出现后重启
+            thread = self.schedule_thread
+            if (thread == None or not thread.is_alive()) and any(i['read_allow'].upper() != 'FALSE' for i in self.nodes.values()):
+                self.schedule_thread = threading.Thread(target=self.update_schedule)
+                self.threads.append(self.schedule_thread)
+                self.schedule_thread.start()
+
+    def watch_config(self, interval = 1.0):
+        """轮询配置文件的修改时间，文件变化后自动重新加载"""
+        try:
+            mtime = os.stat(self.csvfile).st_mtime
+        except OSError:
+            mtime = None
+        while self.watch_run:
+            time.sleep(interval)
+            try:
+                current = os.stat(self.csvfile).st_mtime
+            except OSError:
+                continue
+            if current == mtime:
+                continue
+            mtime = current
+            try:
+                self.reload()
+            except Exception as reason:
+                warnings.warn(f'S7配置重新加载失败：{reason}')
+                if self.logger:
+                    self.logger.error(f'S7配置重新加载失败：{reason}')
+
+    def start_watch_config(self, interval = 1.0):
+        if self.watch_thread:
+            return None
+        self.watch_run = True
+        self.watch_thread = threading.Thread(target=self.watch_config, args=(interval,), daemon=True)
+        self.watch_thread.start()
+
+    def stop_watch_config(self):
+        self.watch_run = False
+        if self.watch_thread == None:
+            return None
+        self.watch_thread.join()
+        self.watch_thread = None
+
+    def make_plan(self, names):
+        """为一组节点生成合并后的读取计划，仅包含允许读取的节点"""
+        ranges = []
+        for name in names:
+            nodeinfo = self.nodes[name]
+            if nodeinfo['read_allow'].upper() != 'FALSE':
+                ranges.append((name, nodeinfo['db'], nodeinfo['start'], nodeinfo['size']))
+        return ReadPlan(ranges, self.pdu_size)
+
+    def update_pdu_size(self):
+        """按S7Client（或连接池）协商的PDU大小重新拆分读取计划"""
+        if self.pool != None:
+            pdu_size = self.pool.get_pdu_length()
+        elif self.S7Client == None or not self.S7Client.get_connected():
+            return None
+        else:
+            pdu_size = self.S7Client.get_pdu_length()
+        self.pdu_size = pdu_size
+        for plan in self.plans.values():
+            plan.set_pdu_size(pdu_size)
 
     def set_logger(self, logger):
         self.logger = logger
 
     def set_S7Client(self, s7c: S7Client):
         self.S7Client = s7c
+        self.update_pdu_size()
+
+    def set_connection_pool(self, pool):
+        """设置连接池后，组读取每个周期从池中租用会话，不同组可并行读取"""
+        self.pool = pool
+        self.update_pdu_size()
+
+    def ready(self):
+        """检查是否已配置可用的连接"""
+        if self.pool != None:
+            if not self.pool.get_connected():
+                warnings.warn('S7连接池没有可用的连接')
+                if self.logger:
+                    self.logger.error('S7连接池没有可用的连接')
+                return False
+            return True
+        if self.S7Client == None:
+            warnings.warn('未初始化S7Client')
+            if self.logger:
+                self.logger.error('未初始化S7Client')
+            return False
+        if not self.S7Client.get_connected():
+            warnings.warn('S7Client未连接')
+            if self.logger:
+                self.logger.error('S7Client未连接')
+            return False
+        return True
 
     def get_S7Client(self):
         return self.S7Client
     
+    def unsupported_type(self, name):
+        warnings.warn('暂不支持的类型：' + self.nodes[name]['type'])
+        if self.logger:
+            self.logger.error('暂不支持的类型：' + self.nodes[name]['type'])
+
+    def get_reader(self, name):
+        """解析get_value的名称（含name[i]位语法），结果缓存后不再重复解析"""
+        node_name, index = split_bit_name(name)
+        if index == -1:
+            raise KeyError(name)
+        reader = (node_name, BitDecoder(index))
+        self.readers[name] = reader
+        return reader
+
     def get_value(self, name):
-        if len(name) > 3 and name[-3] == '[' and name[-1] == ']' and name[-2].isdigit() and 0 <= int(name[-2]) < 8:
-            index = int(name[-2])
-            name = name[:-3]
-            data = (self.node_data[name][0] >> index) & 1
-        elif self.nodes[name]['type'] == 'int':
-            data = snap7.util.get_int(self.node_data[name], 0)
-        elif self.nodes[name]['type'] == 'dint':
-            data = snap7.util.get_dint(self.node_data[name], 0)
-        elif self.nodes[name]['type'] == 'bool':
-            data = snap7.util.get_bool(self.node_data[name], 0, int(self.nodes[name]['offset']))
-        elif self.nodes[name]['type'] == 'boollist':
-            data = [(self.node_data[name][0] >> i) & 1 for i in range(8)]
-        elif self.nodes[name]['type'] == 'real':
-            data = snap7.util.get_real(self.node_data[name], 0)
-        elif self.nodes[name]['type'] == 'string':
-            data = self.node_data[name][2:2+int.from_bytes(self.node_data[name][1:2])].decode('gbk', errors='replace')
-        elif self.nodes[name]['type'] == 'wstring':
-            data = self.node_data[name][4:].decode(encoding='utf-16be', errors='replace')
-        else:
-            warnings.warn('暂不支持的类型：' + self.nodes[name]['type'])
-            if self.logger:
-                self.logger.error('暂不支持的类型：' + self.nodes[name]['type'])
+        """节点的当前值；配置了死区的节点为最近一次推送给订阅点的值，被死区抑制的读取不改变该值"""
+        reader = self.readers.get(name)
+        if reader == None:
+            reader = self.get_reader(name)
+        node_name, decoder = reader
+        if decoder == None:
+            self.unsupported_type(node_name)
             return None
-        
-        return data
-
-    def send(self, name):
-        if self.nodes[name]['type'] == 'int':
-            data = snap7.util.get_int(self.node_data[name], 0)
-        elif self.nodes[name]['type'] == 'dint':
-            data = snap7.util.get_dint(self.node_data[name], 0)
-        elif self.nodes[name]['type'] == 'bool':
-            data = snap7.util.get_bool(self.node_data[name], 0, int(self.nodes[name]['offset']))
-        elif self.nodes[name]['type'] == 'boollist':
-            data = [(self.node_data[name][0] >> i) & 1 for i in range(8)]
-        elif self.nodes[name]['type'] == 'real':
-            data = snap7.util.get_real(self.node_data[name], 0)
-        elif self.nodes[name]['type'] == 'string':
-            data = self.node_data[name][2:2+int.from_bytes(self.node_data[name][1:2])].decode('gbk', errors='replace')
-        elif self.nodes[name]['type'] == 'wstring':
-            data = self.node_data[name][4:].decode(encoding='utf-16be', errors='replace')
-        else:
-            warnings.warn('暂不支持的类型：' + self.nodes[name]['type'])
-            if self.logger:
-                self.logger.error('暂不支持的类型：' + self.nodes[name]['type'])
+        data = self.delivered.get(node_name)
+        if data == None:
+            data = self.node_data[node_name]
+        return decoder.decode(data)
+
+    def send(self, name, stamp = None, data = None, decoder = None):
+        """解码节点并推送给订阅点，stamp为读取时刻的时间戳(s)，给出时通过inject_at随值传递
+        boollist的name[i]订阅按位掩码推送：新旧字节异或后只通知发生变化且有订阅的位
+        data、decoder为在配置锁内取得的节点数据与解码器快照，默认取当前配置
+        """
+        if data == None:
+            data = self.node_data[name]
+        if decoder == None:
+            decoder = self.decoders[name]
+        if decoder == None:
+            self.unsupported_type(name)
             return None
+        begin = time.perf_counter()
 
         if name in self.target_from_name:
+            value = decoder.decode(data)
             for i in self.target_from_name[name]:
-                i.inject(data)
-        if self.nodes[name]['type'] == 'boollist' and name + '*' in self.target_from_name:
-            for i in range(8):
-                for j in self.target_from_name[name+'*'][i]:
-                    j.inject(data[i])
+                if stamp == None:
+                    i.inject(value)
+                else:
+                    i.inject_at(value, stamp)
+        mask = self.bit_masks.get(name)
+        if mask:
+            new = data[0]
+            old = self.bit_state.get(name)
+            self.bit_state[name] = new
+            if old != None:
+                mask &= old ^ new
+            targets = self.target_from_name[name+'*']
+            while mask:
+                low = mask & -mask
+                index = low.bit_length() - 1
+                bit = (new >> index) & 1
+                for j in targets[index]:
+                    if stamp == None:
+                        j.inject(bit)
+                    else:
+                        j.inject_at(bit, stamp)
+                mask ^= low
 
-    def update(self, name):
-        nodeinfo = self.nodes[name]
-        try:
-            while True:
-                if not self.thread_run:
-                    return None
-                self.lock.acquire()
-                if not self.S7Client.get_connected():
-                    warnings.warn('S7Client连接中断')
-                    if self.logger:
-                        self.logger.error('S7Client连接中断')
-                    self.thread_run = False
-                    self.lock.release()
-                    return None
+        cost = time.perf_counter() - begin
+        record = self.send_stats.get(name)
+        if record == None:
+            record = self.send_stats[name] = [0, 0.0, 0.0]
+        record[0] += 1
+        record[1] += cost
+        if cost > record[2]:
+            record[2] = cost
+
+    def write_values(self, values: dict):
+        """批量写入{name: value}，按节点解码器编码，同一DB中相邻/重叠的写入合并后一次write_multi_vars发送
+        与最近一次写入内容相同的节点不再写入，返回实际写入的节点名称列表
+        写入失败时清空写入缓存并进入与读取相同的中断状态，之后的写入按退避间隔重连，未到重连时刻或重连失败时抛出RuntimeError
+        """
+        for name in values.keys():
+            if name not in self.nodes:
+                raise ValueError(f"写入了未配置的点：{name}")
+            if self.nodes[name]['write_allow'].upper() == 'FALSE':
+                raise ValueError(f"节点不允许写入：{name}")
+            if self.decoders[name] == None:
+                raise ValueError('暂不支持的类型：' + self.nodes[name]['type'])
+
+        if self.down_since != None and not self.reconnect():
+            raise RuntimeError('S7连接中断，等待重连')
+        failure = None
+        with self.write_lock:
+            pending = {}    #(db, 地址) -> 本次待写入的字节
+            changed = []
+            for name, value in values.items():
+                nodeinfo = self.nodes[name]
+                db = int(nodeinfo['db'])
+                start = int(nodeinfo['start'])
+                size = int(nodeinfo['size'])
+                addresses = [(db, i) for i in range(start, start + size)]
+                #以本批次已编码的字节、最近写入的字节、最近读取的字节为底，保证按位写入时不覆盖同字节的其他位
+                buf = bytearray(self.node_data[name])
+                for i, address in enumerate(addresses):
+                    if address in pending:
+                        buf[i] = pending[address]
+                    elif address in self.written:
+                        buf[i] = self.written[address]
+                self.decoders[name].encode(value, buf)
+                for i, address in enumerate(addresses):
+                    pending[address] = buf[i]
+                if any(self.written.get(address) != buf[i] for i, address in enumerate(addresses)):
+                    changed.append((name, db, start, size))
+            if not changed:
+                return []
+
+            plan = WritePlan(changed, self.pdu_size)
+            for name, db, start, size in changed:
+                plan.views[name][:] = bytes(pending[(db, i)] for i in range(start, start + size))
+
+            try:
+                if self.pool != None:
+                    with self.pool.lease() as client:
+                        plan.write(client)
+                else:
+                    with self.lock:
+                        plan.write(self.S7Client)
+            except RuntimeError as reason:#PLC中的值已不确定，之后的写入全部重新发送
+                self.written.clear()
+                failure = reason
+            else:
+                for name, db, start, size in changed:
+                    for i in range(start, start + size):
+                        self.written[(db, i)] = pending[(db, i)]
+        if failure != None:
+            self.mark_down()
+            raise failure
+        if self.down_since != None:#只写入的连接没有读取，由写入成功结束中断状态
+            self.mark_up(point_time())
+        return [i[0] for i in changed]
+
+    def clear_written(self):
+        """清空最近写入的缓存，连接中断或重连后PLC中的值可能已被重置，之后的写入全部重新发送"""
+        with self.write_lock:
+            self.written.clear()
+
+    def read_node(self, nodeinfo, stats):
+        """逐点读取一次，返回(数据, 读取时刻的时间戳)，失败时返回(None, None)"""
+        with self.lock:
+            if not self.S7Client.get_connected():
+                stats.error()
+                warnings.warn('S7Client连接中断')
+                if self.logger:
+                    self.logger.error('S7Client连接中断')
+                return None, None
+            begin = time.monotonic()
+            wall = point_time()#与状态点、采集引擎使用同一时钟
+            try:
                 tmp = self.S7Client.db_read(int(nodeinfo['db']), int(nodeinfo['start']), int(nodeinfo['size']))
-                self.lock.release()
-                if self.node_data[name] != tmp:
-                    self.node_data[name] = tmp
-                    self.send(name)
-                time.sleep(float(nodeinfo['frequency']) / 1000)
-        except RuntimeError as reason:
-            warnings.warn(reason)
-            if self.logger:
-                self.logger.error(reason)
-            self.thread_run = False
-            self.lock.release()
+            except RuntimeError as reason:
+                stats.error()
+                warnings.warn(str(reason))
+                if self.logger:
+                    self.logger.error(reason)
+                return None, None
+            latency = time.monotonic() - begin
+        stats.record(latency, len(tmp))
+        return tmp, wall + latency / 2
+
+    def update(self, name):
+        stats = self.node_read_stats[name] = ReadStats()
+        while True:
+            if not self.thread_run:
+                return None
+            nodeinfo = self.nodes.get(name)#配置重新加载后节点可能被删除或改为不可读
+            if nodeinfo == None or nodeinfo['read_allow'].upper() == 'FALSE':
+                return None
+            if self.down_since == None or self.reconnect():
+                tmp, stamp = self.read_node(nodeinfo, stats)
+                if tmp == None:
+                    self.mark_down()
+                else:
+                    self.mark_up(stamp)
+                    decoder = None
+                    with self.config_lock:#推送在锁外进行，同dispatch_plan
+                        current = self.nodes.get(name) is nodeinfo
+                        if current and self.node_data[name] != tmp:
+                            self.node_data[name] = tmp
+                            decoder = self.decoders[name]
+                    if decoder != None:
+                        self.deliver(name, stamp, time.monotonic(), tmp, decoder)
+                    elif current and name in self.deadband_pending:
+                        self.flush_deadband((name,), stamp, time.monotonic())
+            time.sleep(float(nodeinfo['frequency']) / 1000)
 
     def start_auto_update(self):
         if self.thread_run:
@@ -158,87 +639,500 @@ class S7data:
             if self.logger:
                 self.logger.error('S7Client未连接')
             return None
+        self.node_threads = {}
         for key, value in self.nodes.items():
             if value['read_allow'].upper() != 'FALSE':
-                self.threads.append(threading.Thread(target=self.update, args=(value['name'],)))
+                self.node_threads[key] = threading.Thread(target=self.update, args=(value['name'],))
+                self.threads.append(self.node_threads[key])
+        self.update_mode = 'node'
         self.thread_run = True
         for i in self.threads:
             i.start()
 
-    def update_group(self, group_name):
-        nodesname = self.groups[group_name]
-        db_number = []
-        start = []
-        size = []
+    def read_plan(self, plan):
+        """执行一次计划读取，返回响应时间(s)，连接中断或读取失败时返回None
+        设置了连接池时从池中租用会话，否则通过锁共享同一个S7Client
+        """
+        if self.pool != None:
+            try:
+                with self.pool.lease() as client:
+                    read_time = time.monotonic()
+                    plan.read(client)
+                    response = time.monotonic() - read_time
+                    plan.stats.record(response, len(plan.image))
+                    return response
+            except RuntimeError as reason:
+                plan.stats.error()
+                warnings.warn(str(reason))
+                if self.logger:
+                    self.logger.error(reason)
+                return None
+
+        with self.lock:
+            if not self.S7Client.get_connected():
+                plan.stats.error()
+                warnings.warn('S7Client连接中断')
+                if self.logger:
+                    self.logger.error('S7Client连接中断')
+                return None
+            try:
+                read_time = time.monotonic()
+                plan.read(self.S7Client)
+                response = time.monotonic() - read_time
+                plan.stats.record(response, len(plan.image))
+                return response
+            except RuntimeError as reason:
+                plan.stats.error()
+                warnings.warn(str(reason))
+                if self.logger:
+                    self.logger.error(reason)
+                return None
 
-        for name in nodesname:
-            nodeinfo = self.nodes[name]
-            db_number.append(int(nodeinfo['db']))
-            start.append(int(nodeinfo['start']))
-            size.append(int(nodeinfo['size']))
+    def all_points(self):
+        for targets in list(self.target_from_name.values()):
+            for i in targets:
+                if isinstance(i, list):
+                    yield from i
+                else:
+                    yield i
+
+    def mark_down(self):
+        """读取失败时进入中断状态：记录中断开始，并向所有点标记从最近一次成功读取开始的数据缺口"""
+        with self.reconnect_lock:
+            if self.down_since != None:
+                return None
+            self.down_since = time.monotonic()
+            self.gap_start = self.last_good if self.last_good != None else point_time()
+            self.outages += 1
+            self.reconnect_stay = self.reconnect_initial
+            self.next_attempt = 0.0#首次重连立即进行
+        self.clear_written()
+        warnings.warn('S7连接中断，开始自动重连')
+        if self.logger:
+            self.logger.error('S7连接中断，开始自动重连')
+        for point in self.all_points():
+            point.mark_gap(self.gap_start)
+
+    def mark_up(self, stamp):
+        """读取成功：结束中断状态，以本次读取时刻作为数据缺口的终点"""
+        self.last_good = stamp
+        if self.down_since == None:
+            return None
+        with self.reconnect_lock:
+            if self.down_since == None:
+                return None
+            duration = time.monotonic() - self.down_since
+            self.downtime += duration
+            self.last_outage = duration
+            self.down_since = None
+            start = self.gap_start
+        if self.logger:
+            self.logger.info(f'S7连接已恢复，中断{duration:.1f}s')
+        for point in self.all_points():
+            point.mark_gap(start, stamp)
+
+    def reconnect(self):
+        """中断期间按指数退避尝试重连，同一时刻只有一个线程进行尝试，返回是否应当尝试读取"""
+        with self.reconnect_lock:
+            now = time.monotonic()
+            if now < self.next_attempt:
+                return False
+            self.next_attempt = now + self.reconnect_stay
+            self.reconnect_stay = min(self.reconnect_stay * 2, self.reconnect_max_stay)
+        if self.pool != None:#连接池在租用时替换已断开的会话
+            self.clear_written()
+            return True
+        with self.lock:
+            if self.S7Client.get_connected():
+                return True
+            try:
+                self.S7Client.reconnect()
+            except RuntimeError as reason:
+                warnings.warn(f'S7重连失败：{reason}')
+                if self.logger:
+                    self.logger.error(f'S7重连失败：{reason}')
+                return False
+        self.clear_written()
+        return True
+
+    def poll_plan(self, plan):
+        """带自动重连的计划读取，返回响应时间(s)；中断期间未到重连时刻或读取失败时返回None"""
+        if self.down_since != None and not self.reconnect():
+            return None
+        response = self.read_plan(plan)
+        if response == None:
+            self.mark_down()
+        else:
+            self.mark_up(plan.stamp)
+        return response
+
+    def group_period(self, group_name):
+        """组的轮询周期(s)，取组内可读节点frequency的最小值"""
+        periods = [float(self.nodes[name]['frequency']) for name in self.plans[group_name].names()]
+        return min(periods) / 1000 if periods else 0.0
+
+    def update_group(self, group_name, adaptive = False):
+        """按组读取，以单调时钟截止时间控制轮询周期
+        adaptive：PLC响应时间升高时自动拉长周期，响应恢复后再缩回配置值
+        """
+        plan = self.plans.get(group_name)
+        if plan == None or not plan.requests:
+            return None
+
+        period = self.group_period(group_name)
+        stats = {'period': period, 'cycles': 0, 'overruns': 0, 'skipped': 0, 'response': 0.0}
+        self.group_stats[group_name] = stats
+        deadline = time.monotonic()
 
         while True:
             if not self.thread_run:
                 return None
-            
-            tmp = False
-            read_valid = True
-            with self.lock:
-                if not self.S7Client.get_connected():
-                    warnings.warn('S7Client连接中断')
-                    if self.logger:
-                        self.logger.error('S7Client连接中断')
-                    self.thread_run = False
+            if plan.retired:#配置已重新加载，换用新的计划与周期
+                plan = self.plans.get(group_name)
+                if plan == None or not plan.requests:
                     return None
+                period = self.group_period(group_name)
+                stats['period'] = period
+
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+                continue
+            
+            response = self.poll_plan(plan)
+            if response != None:
+                self.dispatch_plan(plan)
+                #响应时间的指数滑动平均
+                stats['response'] += (response - stats['response']) * self.response_smoothing
+                stats['cycles'] += 1
+                if adaptive:
+                    stats['period'] = max(period, stats['response'] * self.adaptive_ratio)
+
+            deadline += stats['period']
+            now = time.monotonic()
+            if now > deadline:#本周期超时，跳过已错过的周期
+                stats['overruns'] += 1
+                missed = int((now - deadline) / stats['period']) if stats['period'] > 0 else 0
+                stats['skipped'] += missed
+                deadline += missed * stats['period']
+
+    def poll_group(self, group_name, stamp = None):
+        """执行一次组读取并推送变化，供外部调度器调用，返回是否读取成功
+        stamp为调度器给出的帧时刻，给出时本帧所有样本都以它为时间戳，使不同PLC的帧对齐到同一时钟；否则使用读取调用的中点时刻
+        """
+        plan = self.plans.get(group_name)
+        if plan == None or not plan.requests:#组已在重新加载时删除
+            return True
+        if self.poll_plan(plan) == None:
+            return False
+        if stamp == None:
+            stamp = plan.stamp
+        self.last_frame[group_name] = stamp
+        self.dispatch_plan(plan, stamp)
+        return True
+
+    def get_group_stats(self, group_name = None):
+        """返回组轮询统计：当前周期(s)、周期数、超时次数、跳过周期数、平均响应时间(s)"""
+        if group_name != None:
+            return dict(self.group_stats[group_name])
+        return {i: self.get_group_stats(i) for i in list(self.group_stats.keys())}
+
+    def dispatch_plan(self, plan, stamp = None):
+        """通过整块镜像的异或比较找出变化的节点，只对这些节点解码并连同读取时刻推送给订阅点
+        stamp为帧时刻，默认使用计划的读取时刻
+        """
+        if stamp == None:
+            stamp = plan.stamp
+        changed = []
+        with self.config_lock:#只在更新节点数据、取快照时持有配置锁，推送在锁外进行，经不同连接读取的组可以同时推送
+            if plan.retired:
+                return None
+            for name in plan.changed():
+                data = plan.views[name]
+                if self.node_data[name] != data:
+                    data = self.node_data[name] = bytearray(data)
+                    changed.append((name, data, self.decoders[name]))
+        for name, data, decoder in changed:
+            self.deliver(name, stamp, plan.mono, data, decoder)
+        if self.deadband_pending:
+            self.flush_deadband(plan.slices, stamp, plan.mono)
+
+    def deliver(self, name, stamp, now, data = None, decoder = None):
+        """节点数据变化后推送，配置了死区的节点变化量未超出死区时暂不推送；data、decoder同send"""
+        if data == None:
+            data = self.node_data[name]
+        if decoder == None:
+            decoder = self.decoders[name]
+        deadband = self.deadbands.get(name)
+        if deadband != None:
+            if not deadband.check(decoder.decode(data), now):
+                self.deadband_pending[name] = deadband
+                return None
+            self.deadband_pending.pop(name, None)
+            self.delivered[name] = bytes(data)
+        self.send(name, stamp, data, decoder)
 
-                try:
-                    tmp = self.S7Client.multi_db_read_py(db_number, start, size)
-                except RuntimeError as reason:
-                    warnings.warn(reason)
-                    read_valid = False
-                    if self.logger:
-                        self.logger.error(reason)
-                    self.thread_run = False
-
-            if read_valid and tmp:
-                for i in range(len(tmp)):
-                    if self.node_data[nodesname[i]] != tmp[i]:
-                        self.node_data[nodesname[i]] = tmp[i]
-                        self.send(nodesname[i])
-
-    def auto_update_group(self):
+    def flush_deadband(self, names, stamp, now):
+        """本次读取覆盖的节点中，被死区抑制且已到心跳时刻的值按当前数据推送，在配置锁外调用，跳过已被删除的节点"""
+        for name, deadband in list(self.deadband_pending.items()):
+            if name in names and deadband.due(now):
+                with self.config_lock:
+                    data = self.node_data.get(name)
+                    decoder = self.decoders.get(name)
+                if data == None or self.deadband_pending.pop(name, None) == None:
+                    continue
+                deadband.check(decoder.decode(data), now)
+                self.delivered[name] = bytes(data)
+                self.send(name, stamp, data, decoder)
+
+    def auto_update_group(self, adaptive = False):
         if self.thread_run:
             return None
         self.threads = []
-        if self.S7Client == None:
-            warnings.warn('未初始化S7Client')
-            if self.logger:
-                self.logger.error('未初始化S7Client')
-            return None
-        if not self.S7Client.get_connected():
-            warnings.warn('S7Client未连接')
-            if self.logger:
-                self.logger.error('S7Client未连接')
+        if not self.ready():
             return None
+        self.update_pdu_size()
         
+        self.group_threads = {}
         for group in self.groups.keys():
-            self.threads.append(threading.Thread(target=self.update_group, args=(group,)))
+            self.group_threads[group] = threading.Thread(target=self.update_group, args=(group, adaptive))
+            self.threads.append(self.group_threads[group])
 
+        self.update_mode = 'group'
+        self.update_args = (adaptive,)
         self.thread_run = True
         for i in self.threads:
             i.start()
 
+    def update_schedule(self, tolerance = 5):
+        """单线程调度：按frequency列维护截止时间堆，同一时刻到期的节点合并为一次读取
+        tolerance：截止时间相差不超过tolerance毫秒的节点视为同时到期
+        """
+        version = None
+        while True:
+            if not self.thread_run:
+                return None
+
+            if version != self.config_version:#首次运行或配置已重新加载，重建频率分组
+                version = self.config_version
+                rates = {}
+                for name, nodeinfo in list(self.nodes.items()):
+                    if nodeinfo['read_allow'].upper() != 'FALSE':
+                        period = float(nodeinfo['frequency']) / 1000
+                        if period not in rates:
+                            rates[period] = []
+                        rates[period].append(name)
+                if not rates:
+                    return None
+                self.schedule_plans = {}
+                heap = []
+                now = time.monotonic()
+                for period in rates.keys():
+                    heapq.heappush(heap, (now, period))
+
+            now = time.monotonic()
+            if heap[0][0] > now:
+                time.sleep(heap[0][0] - now)
+                continue
+
+            due = []
+            while heap and heap[0][0] <= now + tolerance / 1000:
+                due.append(heapq.heappop(heap))
+            key = tuple(sorted(period for deadline, period in due))
+            with self.config_lock:
+                if version != self.config_version:
+                    continue
+                if key not in self.schedule_plans:
+                    self.schedule_plans[key] = self.make_plan([name for period in key for name in rates[period]])
+                plan = self.schedule_plans[key]
+
+            read_time = time.monotonic()
+            response = self.poll_plan(plan)
+
+            for deadline, period in due:
+                if response != None:
+                    self.record_jitter(rates[period], read_time - deadline)
+                deadline += period
+                if deadline <= read_time:#错过的周期直接跳过，保持原有相位
+                    deadline += (int((read_time - deadline) / period) + 1) * period
+                heapq.heappush(heap, (deadline, period))
+
+            if response != None:
+                self.dispatch_plan(plan)
+
+    def record_jitter(self, names, jitter):
+        """记录节点实际读取时刻相对计划时刻的偏差(ms)"""
+        jitter *= 1000
+        for name in names:
+            if name not in self.jitter:
+                self.jitter[name] = [0, 0.0, 0.0, 0.0]#次数、累计、最大、最近一次
+            record = self.jitter[name]
+            record[0] += 1
+            record[1] += jitter
+            record[3] = jitter
+            if abs(jitter) > abs(record[2]):
+                record[2] = jitter
+
+    def get_jitter(self, name = None):
+        """返回调度模式下节点的读取抖动统计(ms)"""
+        if name != None:
+            count, total, peak, last = self.jitter[name]
+            return {'count': count, 'mean': total / count if count else 0.0, 'max': peak, 'last': last}
+        return {i: self.get_jitter(i) for i in list(self.jitter.keys())}
+
+    def start_auto_schedule(self):
+        """调度模式：每个PLC连接只用一个线程，可替代start_auto_update与auto_update_group"""
+        if self.thread_run:
+            return None
+        self.threads = []
+        if not self.ready():
+            return None
+        self.update_pdu_size()
+        self.jitter = {}
+
+        self.schedule_thread = threading.Thread(target=self.update_schedule)
+        self.threads.append(self.schedule_thread)
+        self.update_mode = 'schedule'
+        self.thread_run = True
+        for i in self.threads:
+            i.start()
+
+    def summarize_reads(self, sources, expected):
+        """合并若干ReadStats，expected为配置的读取频率(Hz)"""
+        latency = LatencyHistogram()
+        reads = errors = size = 0
+        rate = 0.0
+        for stats in sources:
+            latency.merge(stats.latency)
+            reads += stats.reads
+            errors += stats.errors
+            size += stats.bytes
+            rate += stats.rate()
+        elapsed = max([stats.elapsed() for stats in sources] or [0.0])
+        res = latency.summary()
+        del res['count']
+        res.update({
+            'reads': reads,
+            'errors': errors,
+            'rate': rate,
+            'expected': expected,
+            'bytes': size,
+            'bytes/s': size / elapsed if elapsed else 0.0
+        })
+        return res
+
+    def stats(self):
+        """采集统计快照
+        groups：每组的读取次数、失败次数、延迟p50/p95/p99(ms)、实际/配置读取频率(Hz)、读取字节数、变化次数与变化频率、send耗时(ms)
+        nodes：每个节点上述同样的指标，读取指标取自包含该节点的所有读取计划（调度模式下为合并计划）
+        计数由各读取线程单独写入，这里不加锁直接读取，个别数值可能相差一个周期
+        """
+        sources = {}    #节点名 -> [ReadStats, ...]
+        plans = list(self.plans.values()) + list(self.schedule_plans.values())
+        for plan in plans:
+            for name in plan.names():
+                sources.setdefault(name, []).append(plan.stats)
+        for name, stats in list(self.node_read_stats.items()):
+            sources.setdefault(name, []).append(stats)
+
+        nodes = {}
+        for name, nodeinfo in list(self.nodes.items()):
+            frequency = float(nodeinfo['frequency'])
+            res = self.summarize_reads(sources.get(name, []), 1000 / frequency if frequency else 0.0)
+            changes, send_total, send_max = self.send_stats.get(name, (0, 0.0, 0.0))
+            elapsed = max([stats.elapsed() for stats in sources.get(name, [])] or [0.0])
+            res.update({
+                'changes': changes,
+                'changes/s': changes / elapsed if elapsed else 0.0,
+                'send_mean': send_total / changes * 1000 if changes else 0.0,
+                'send_max': send_max * 1000,
+                'suppressed': self.deadbands[name].suppressed if name in self.deadbands else 0
+            })
+            nodes[name] = res
+
+        groups = {}
+        for group, names in list(self.groups.items()):
+            period = self.group_period(group) if group in self.plans else 0.0
+            #按组读取时即组计划本身；调度与逐点模式下为覆盖组内节点的各合并计划/节点
+            group_sources = list({id(stats): stats for name in names for stats in sources.get(name, [])}.values())
+            res = self.summarize_reads(group_sources, 1 / period if period else 0.0)
+            #组的实际频率取组内读取最快的节点，与按最小frequency计算的配置频率对应
+            res['rate'] = max([nodes[name]['rate'] for name in names if name in nodes] or [0.0])
+            changes = sum(nodes[name]['changes'] for name in names if name in nodes)
+            elapsed = max([stats.elapsed() for stats in group_sources] or [0.0])
+            res.update({
+                'changes': changes,
+                'changes/s': changes / elapsed if elapsed else 0.0,
+                'send_total': sum(self.send_stats.get(name, (0, 0.0, 0.0))[1] for name in names) * 1000
+            })
+            groups[group] = res
+        return {'groups': groups, 'nodes': nodes, 'connection': self.connection_stats()}
+
+    def connection_stats(self):
+        """连接状态、中断次数、累计中断时长、当前/最近一次中断时长(s)"""
+        down_since = self.down_since
+        current = time.monotonic() - down_since if down_since != None else 0.0
+        return {
+            'connected': down_since == None,
+            'outages': self.outages,
+            'downtime': self.downtime + current,
+            'current': current,
+            'last': self.last_outage
+        }
+
+    def log_stats(self, nodes = False):
+        """按组输出一次统计，nodes为True时同时以debug级别输出每个节点"""
+        if not self.logger:
+            return None
+        res = self.stats()
+        i = res['connection']
+        state = '正常' if i['connected'] else f"中断中({i['current']:.1f}s)"
+        self.logger.info(f"[S7统计][连接] {state} 中断{i['outages']}次 累计{i['downtime']:.1f}s 最近一次{i['last']:.1f}s")
+        for group, i in res['groups'].items():
+            self.logger.info(f"[S7统计][组{group}] 读取{i['reads']}次 失败{i['errors']}次 "
+                             f"延迟p50/p95/p99={i['p50']:.2f}/{i['p95']:.2f}/{i['p99']:.2f}ms "
+                             f"频率{i['rate']:.2f}/{i['expected']:.2f}Hz 读取{i['bytes/s']:.0f}B/s "
+                             f"变化{i['changes/s']:.2f}次/s send累计{i['send_total']:.1f}ms")
+        if nodes:
+            for name, i in res['nodes'].items():
+                self.logger.debug(f"[S7统计][{name}] 读取{i['reads']}次 失败{i['errors']}次 "
+                                  f"频率{i['rate']:.2f}/{i['expected']:.2f}Hz 变化{i['changes']}次({i['changes/s']:.2f}次/s) "
+                                  f"send平均/最大{i['send_mean']:.3f}/{i['send_max']:.3f}ms")
+
+    def stats_logger(self, interval, nodes):
+        deadline = time.monotonic()
+        while self.stats_run:
+            deadline += interval
+            while self.stats_run and time.monotonic() < deadline:
+                time.sleep(max(0.0, min(1.0, deadline - time.monotonic())))
+            if self.stats_run:
+                self.log_stats(nodes)
+
+    def start_stats_logger(self, interval = 60, nodes = False):
+        """每interval秒通过logger输出一次采集统计"""
+        if self.stats_thread:
+            return None
+        self.stats_run = True
+        self.stats_thread = threading.Thread(target=self.stats_logger, args=(interval, nodes), daemon=True)
+        self.stats_thread.start()
+
+    def stop_stats_logger(self):
+        self.stats_run = False
+        if self.stats_thread == None:
+            return None
+        self.stats_thread.join()
+        self.stats_thread = None
+
     def end_auto_update(self):
         self.thread_run = False
         for i in self.threads:
             i.join()
+        self.update_mode = None
 
     def make_point(self, name, point_type = Statepoint):
-        index = -1
         solvedname = name
-        if len(name) > 3 and name[-3] == '[' and name[-1] == ']' and name[-2].isdigit() and 0 <= int(name[-2]) < 8:
-            index = int(name[-2])
-            name = name[:-3]
+        name, index = split_bit_name(name)
+        if index != -1:
             solvedname = name + '*'
         if name not in self.nodes:
             raise ValueError("创建了未配置的点")
@@ -254,5 +1148,14 @@ class S7data:
             self.target_from_name[solvedname].append(res)
         else:
             self.target_from_name[solvedname][index].append(res)
-        self.send(name)
+            if isinstance(self.decoders[name], BoolListDecoder):
+                self.bit_masks[name] = self.bit_masks.get(name, 0) | (1 << index)
+                self.bit_state.setdefault(name, self.node_data[name][0])
+        #只向新建的点推送当前值，已有的点不重复注入
+        if self.decoders[name] == None:
+            self.unsupported_type(name)
+        elif index == -1:
+            res.inject(self.get_value(name))
+        else:
+            res.inject(self.get_value(f'{name}[{index}]'))
         return res
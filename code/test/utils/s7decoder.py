@@ -0,0 +1,127 @@
+import struct
+
+class NodeDecoder:
+    """节点解码器基类：在加载CSV时按节点类型编译一次，读取时只需一次decode调用"""
+    def decode(self, buf):
+        raise NotImplementedError
+
+    def encode(self, value, buf):
+        """将value编码写入buf（节点大小的bytearray，按位写入的类型保留其余位）"""
+        raise NotImplementedError
+
+class StructDecoder(NodeDecoder):
+    """int/dint/real：预编译的struct.Struct"""
+    def __init__(self, fmt):
+        self.struct = struct.Struct(fmt)
+        self.unpack_from = self.struct.unpack_from
+
+    def decode(self, buf):
+        return self.unpack_from(buf)[0]
+
+    def encode(self, value, buf):
+        self.struct.pack_into(buf, 0, value)
+
+class BoolDecoder(NodeDecoder):
+    """bool：按offset列预计算的位掩码"""
+    def __init__(self, offset):
+        self.mask = 1 << int(offset)
+
+    def decode(self, buf):
+        return buf[0] & self.mask != 0
+
+    def encode(self, value, buf):
+        buf[0] = buf[0] | self.mask if value else buf[0] & ~self.mask
+
+class BitDecoder(NodeDecoder):
+    """name[i]：取首字节的第i位，返回0/1"""
+    def __init__(self, index):
+        self.index = index
+
+    def decode(self, buf):
+        return (buf[0] >> self.index) & 1
+
+    def encode(self, value, buf):
+        buf[0] = buf[0] | (1 << self.index) if value else buf[0] & ~(1 << self.index)
+
+class BoolListDecoder(NodeDecoder):
+    """boollist：首字节的8个位"""
+    def decode(self, buf):
+        b = buf[0]
+        return [(b >> i) & 1 for i in range(8)]
+
+    def encode(self, value, buf):
+        b = 0
+        for i in range(8):
+            if value[i]:
+                b |= 1 << i
+        buf[0] = b
+
+class StringDecoder(NodeDecoder):
+    """S7 string：第2字节为实际长度，数据从第3字节开始"""
+    def __init__(self, encoding = 'gbk'):
+        self.encoding = encoding
+
+    def decode(self, buf):
+        return str(buf[2:2 + buf[1]], self.encoding, 'replace')
+
+    def encode(self, value, buf):
+        data = value.encode(self.encoding)[:min(len(buf) - 2, 254)]
+        buf[0] = min(len(buf) - 2, 254)
+        buf[1] = len(data)
+        buf[2:2 + len(data)] = data
+        buf[2 + len(data):] = bytes(len(buf) - 2 - len(data))
+
+class WStringDecoder(NodeDecoder):
+    """S7 wstring：跳过4字节头，按UTF-16BE解码"""
+    def __init__(self):
+        self.data = slice(4, None)
+
+    def decode(self, buf):
+        return str(buf[self.data], 'utf-16be', 'replace')
+
+    def encode(self, value, buf):
+        capacity = (len(buf) - 4) // 2
+        data = value.encode('utf-16be')[:capacity * 2]
+        buf[0:2] = capacity.to_bytes(2, 'big')
+        buf[2:4] = (len(data) // 2).to_bytes(2, 'big')
+        buf[4:4 + len(data)] = data
+        buf[4 + len(data):] = bytes(len(buf) - 4 - len(data))
+
+class IntListDecoder(NodeDecoder):
+    """int_list：整块数据按大端int数组解析"""
+    def __init__(self, size):
+        self.struct = struct.Struct(f'>{int(size) // 2}h')
+        self.unpack_from = self.struct.unpack_from
+
+    def decode(self, buf):
+        return list(self.unpack_from(buf))
+
+    def encode(self, value, buf):
+        self.struct.pack_into(buf, 0, *value)
+
+def compile_decoder(nodeinfo):
+    """根据CSV中的一行节点配置生成解码器，不支持的类型返回None"""
+    node_type = nodeinfo['type']
+    if node_type == 'int':
+        return StructDecoder('>h')
+    elif node_type == 'dint':
+        return StructDecoder('>i')
+    elif node_type == 'real':
+        return StructDecoder('>f')
+    elif node_type == 'bool':
+        return BoolDecoder(nodeinfo['offset'])
+    elif node_type == 'boollist':
+        return BoolListDecoder()
+    elif node_type == 'string':
+        return StringDecoder()
+    elif node_type == 'wstring':
+        return WStringDecoder()
+    elif node_type == 'int_list':
+        return IntListDecoder(nodeinfo['size'])
+    return None
+
+def split_bit_name(name):
+    """解析name[i]形式的位订阅名称，返回(name, i)，不是位订阅时返回(name, -1)"""
+    if len(name) > 3 and name[-3] == '[' and name[-1] == ']' and name[-2].isdigit() and 0 <= int(name[-2]) < 8:
+        return name[:-3], int(name[-2])
+    return name, -1
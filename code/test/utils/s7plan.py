@@ -0,0 +1,213 @@
+import numpy as np
+import time
+from utils.s7stats import ReadStats
+from utils.statepoint import point_time
+
+class ReadPlan:
+    """读取计划：将同一DB中相邻/重叠的读取区域合并为连续块，
+    再按协商的PDU大小和read_multi_vars单次最多20项的限制拆分成若干次请求。
+    所有块按顺序排布在一段连续的组镜像(image)中，每个节点的数据以memoryview切片取出。
+    """
+    MAX_ITEMS = 20      #read_multi_vars单次请求的最大项数
+    REQ_HEADER = 12     #请求报文头+参数头
+    REQ_ITEM = 12       #请求中每一项的参数长度
+    RES_HEADER = 14     #响应报文头+参数头
+    RES_ITEM = 4        #响应中每一项的数据头长度
+
+    def __init__(self, ranges, pdu_size = 240, gap = 0):
+        """ranges：[(name, db, start, size), ...]
+        pdu_size：协商的PDU大小，连接前按S7-300最小值240规划
+        gap：同一DB中两段区域间隔不超过gap字节时也合并为一块
+        """
+        self.ranges = [(name, int(db), int(start), int(size)) for name, db, start, size in ranges]
+        self.gap = gap
+        self.pdu_size = 0
+        self.blocks = []    #[(db, start, size, image_offset), ...]
+        self.requests = []  #[[block_index, ...], ...] 每一项对应一次read_multi_vars
+        self.slices = {}    #name -> (image_offset, size)
+        self.image = bytearray()
+        self.prepared = None    #每次请求对应的预分配读取对象，首次读取时创建
+        self.mono = None        #最近一次读取的单调时钟采样时刻(s)，取snap7调用前后的中点
+        self.stamp = None       #与mono对应的系统时间戳(s)
+        self.retired = False    #配置重新加载后被替换的计划不再推送数据
+        self.stats = ReadStats()
+        self.set_pdu_size(pdu_size)
+
+    def set_pdu_size(self, pdu_size):
+        pdu_size = int(pdu_size)
+        if pdu_size == self.pdu_size:
+            return None
+        if pdu_size <= self.RES_HEADER + self.RES_ITEM + 1:
+            raise ValueError(f"PDU大小不合法：{pdu_size}")
+        self.pdu_size = pdu_size
+        self._build()
+
+    def max_block_size(self):
+        """单个块在一次响应中能携带的最大字节数（取偶数）"""
+        return (self.pdu_size - self.RES_HEADER - self.RES_ITEM) & ~1
+
+    def item_cost(self, size):
+        """一个块在请求与响应报文中分别占用的字节数"""
+        return self.REQ_ITEM, self.RES_ITEM + size + (size & 1)
+
+    def _build(self):
+        max_block = self.max_block_size()
+
+        #1.按(db, start)排序后合并相邻/重叠区域
+        merged = []     #[[db, start, end, [name, ...]], ...]
+        for name, db, start, size in sorted(self.ranges, key=lambda r: (r[1], r[2], -r[3])):
+            end = start + size
+            if merged and merged[-1][0] == db and start <= merged[-1][2] + self.gap:
+                last = merged[-1]
+                if end > last[2]:
+                    last[2] = end
+                last[3].append(name)
+            else:
+                merged.append([db, start, end, [name]])
+
+        #2.超过单块上限的区域拆分为连续的块，块在镜像中依次排布
+        self.blocks = []
+        located = {}    #name -> (合并区域在镜像中的偏移, 合并区域起始地址)
+        offset = 0
+        for db, start, end, names in merged:
+            base = offset
+            pos = start
+            while pos < end:
+                size = min(max_block, end - pos)
+                self.blocks.append((db, pos, size, offset))
+                offset += size
+                pos += size
+            for name in names:
+                located[name] = (base, start)
+        self.slices = {}
+        for name, db, start, size in self.ranges:
+            base, block_start = located[name]
+            self.slices[name] = (base + start - block_start, size)
+        self.image = bytearray(offset)
+        self.prepared = None
+        self._build_change_table()
+
+        #3.按项数及请求/响应报文长度将块装入请求
+        self.requests = []
+        current = []
+        req_len = self.REQ_HEADER
+        res_len = self.RES_HEADER
+        for index, (db, start, size, image_offset) in enumerate(self.blocks):
+            item_req, item_res = self.item_cost(size)
+            if current and (len(current) >= self.MAX_ITEMS
+                            or req_len + item_req > self.pdu_size
+                            or res_len + item_res > self.pdu_size):
+                self.requests.append(current)
+                current = []
+                req_len = self.REQ_HEADER
+                res_len = self.RES_HEADER
+            current.append(index)
+            req_len += item_req
+            res_len += item_res
+        if current:
+            self.requests.append(current)
+
+    def _build_change_table(self):
+        """预计算字节->节点映射表，供整块镜像的变化检测使用"""
+        size = len(self.image)
+        self.previous = bytearray(size)
+        self.current_array = np.frombuffer(self.image, dtype=np.uint8)
+        self.previous_array = np.frombuffer(self.previous, dtype=np.uint8)
+        self.xor_array = np.zeros(size, dtype=np.uint8)
+        self.node_names = list(self.slices.keys())
+        image = memoryview(self.image)
+        self.views = {name: image[image_offset:image_offset + nsize] for name, (image_offset, nsize) in self.slices.items()}
+
+        owners = [[] for i in range(size)]
+        for index, name in enumerate(self.node_names):
+            image_offset, nsize = self.slices[name]
+            for i in range(image_offset, image_offset + nsize):
+                owners[i].append(index)
+        #每个字节至多属于一个节点时直接查表，否则(如同一字节上的多个bool)使用CSR格式
+        self.single_owner = all(len(i) <= 1 for i in owners)
+        self.byte_owner = np.array([i[0] if i else -1 for i in owners], dtype=np.intp)
+        self.byte_ptr = np.zeros(size + 1, dtype=np.intp)
+        self.byte_ptr[1:] = np.cumsum([len(i) for i in owners])
+        self.byte_nodes = np.array([j for i in owners for j in i], dtype=np.intp)
+
+    def changed(self):
+        """与上一次镜像做异或，返回发生变化的节点名称（按配置顺序），并记录当前镜像"""
+        np.bitwise_xor(self.current_array, self.previous_array, out=self.xor_array)
+        if not self.xor_array.any():
+            return []
+        diff = np.flatnonzero(self.xor_array)
+        np.copyto(self.previous_array, self.current_array)
+
+        if self.single_owner:
+            indices = self.byte_owner[diff]
+            indices = indices[indices >= 0]
+        else:
+            starts = self.byte_ptr[diff]
+            counts = self.byte_ptr[diff + 1] - starts
+            total = int(counts.sum())
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            indices = self.byte_nodes[positions]
+        return [self.node_names[i] for i in np.unique(indices)]
+
+    def prepare(self, client):
+        """为每次请求创建预分配的读取对象，读取结果直接写入组镜像"""
+        self.prepared = []
+        for request in self.requests:
+            db_number = [self.blocks[i][0] for i in request]
+            start = [self.blocks[i][1] for i in request]
+            size = [self.blocks[i][2] for i in request]
+            prepared = client.prepare_multi_db_read(db_number, start, size)
+            prepared.bind(self.image, [self.blocks[i][3] for i in request])
+            self.prepared.append(prepared)
+
+    def read(self, client):
+        """按计划执行读取，结果写入组镜像"""
+        if self.prepared == None:
+            self.prepare(client)
+        begin = time.monotonic()
+        wall = point_time()#与状态点、采集引擎使用同一时钟
+        for prepared in self.prepared:
+            prepared.read(client)
+        end = time.monotonic()
+        self.mono = (begin + end) / 2
+        self.stamp = wall + (end - begin) / 2
+        return self.image
+
+    def view(self, name):
+        return self.views[name]
+
+    def items(self):
+        """依次返回(name, memoryview)"""
+        return self.views.items()
+
+    def names(self):
+        return list(self.slices.keys())
+
+    def __len__(self):
+        return len(self.requests)
+
+
+class WritePlan(ReadPlan):
+    """写入计划：合并同一DB中相邻/重叠的写入区域，按PDU大小和20项限制拆分为若干次write_multi_vars
+    写入数据先填入组镜像，再由各项直接引用镜像中的对应位置发送。
+    """
+    RES_ITEM = 1    #写入响应中每一项只返回1字节结果
+
+    def max_block_size(self):
+        return (self.pdu_size - self.REQ_HEADER - self.REQ_ITEM - 4) & ~1
+
+    def item_cost(self, size):
+        return self.REQ_ITEM + 4 + size + (size & 1), self.RES_ITEM
+
+    def _build_change_table(self):
+        image = memoryview(self.image)
+        self.views = {name: image[image_offset:image_offset + nsize] for name, (image_offset, nsize) in self.slices.items()}
+
+    def write(self, client):
+        """按计划执行写入，数据取自组镜像"""
+        image = memoryview(self.image)
+        for request in self.requests:
+            db_number = [self.blocks[i][0] for i in request]
+            start = [self.blocks[i][1] for i in request]
+            data = [image[self.blocks[i][3]:self.blocks[i][3] + self.blocks[i][2]] for i in request]
+            client.multi_db_write_py(db_number, start, data)
@@ -0,0 +1,114 @@
+from utils.s7data import S7Client
+from contextlib import contextmanager
+import queue, threading, time, warnings
+
+class S7ConnectionPool:
+    """同一PLC的多会话连接池
+    各组每个周期租用一个会话，使相互独立的组可以并行读取；
+    租用时检查会话状态并替换已断开的会话，同时统计排队等待时间。
+    """
+    def __init__(self, address, rack, slot, size = 2, tcp_port = 102, client_type = S7Client):
+        self.logger = None
+        self.address = address
+        self.rack = rack
+        self.slot = slot
+        self.tcp_port = tcp_port
+        self.size = size
+        self.client_type = client_type
+        self.idle = queue.Queue()
+        self.sessions = []
+        self.stats_lock = threading.Lock()
+        self.leases = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.replaced = 0
+        self.failures = 0
+
+    def set_logger(self, logger):
+        self.logger = logger
+
+    def new_session(self):
+        client = self.client_type()
+        client.connect(self.address, self.rack, self.slot, self.tcp_port, retry=False)#重连节奏由调用方控制
+        return client
+
+    def open(self):
+        """建立全部会话，连接失败的会话在首次租用时再重连"""
+        for i in range(self.size - len(self.sessions)):
+            try:
+                client = self.new_session()
+            except RuntimeError as reason:
+                warnings.warn(f'S7会话建立失败：{reason}')
+                if self.logger:
+                    self.logger.error(f'S7会话建立失败：{reason}')
+                client = self.client_type()
+            self.sessions.append(client)
+            self.idle.put(client)
+
+    def close(self):
+        for client in self.sessions:
+            try:
+                client.disconnect()
+            except RuntimeError:
+                pass
+        self.sessions = []
+        self.idle = queue.Queue()
+
+    def replace(self, client):
+        """替换已断开的会话，失败时保留原会话并抛出RuntimeError"""
+        try:
+            client.disconnect()
+        except RuntimeError:
+            pass
+        new = self.new_session()
+        self.sessions[self.sessions.index(client)] = new
+        with self.stats_lock:
+            self.replaced += 1
+        return new
+
+    @contextmanager
+    def lease(self, timeout = None):
+        """租用一个健康的会话，用完自动归还"""
+        wait_start = time.monotonic()
+        try:
+            client = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("S7连接池等待会话超时")
+        wait = time.monotonic() - wait_start
+        with self.stats_lock:
+            self.leases += 1
+            self.wait_total += wait
+            if wait > self.wait_max:
+                self.wait_max = wait
+
+        try:
+            if not client.get_connected():
+                client = self.replace(client)
+            yield client
+        except RuntimeError:
+            with self.stats_lock:
+                self.failures += 1
+            raise
+        finally:
+            self.idle.put(client)
+
+    def get_connected(self):
+        return any(i.get_connected() for i in self.sessions)
+
+    def get_pdu_length(self):
+        """返回已连接会话中最小的协商PDU大小"""
+        sizes = [i.get_pdu_length() for i in self.sessions if i.get_connected()]
+        return min(sizes) if sizes else 240
+
+    def get_stats(self):
+        """租用次数、平均/最大排队等待时间(ms)、会话替换次数、失败次数"""
+        with self.stats_lock:
+            return {
+                'sessions': len(self.sessions),
+                'idle': self.idle.qsize(),
+                'leases': self.leases,
+                'wait_mean': self.wait_total / self.leases * 1000 if self.leases else 0.0,
+                'wait_max': self.wait_max * 1000,
+                'replaced': self.replaced,
+                'failures': self.failures
+            }
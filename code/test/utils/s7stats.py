@@ -0,0 +1,99 @@
+import math, time
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图：每个2的幂区间分为SUB个桶，相对误差约1/SUB
+    只由一个线程写入，读取方直接拷贝计数，不需要加锁。
+    """
+    SUB = 4
+    MIN_EXP = -17   #2^-17 s ≈ 7.6 us
+    MAX_EXP = 4     #2^4 s = 16 s
+
+    def __init__(self):
+        self.counts = [0] * ((self.MAX_EXP - self.MIN_EXP) * self.SUB + 2)#首尾各一个溢出桶
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        mantissa, exponent = math.frexp(value)#value = mantissa * 2^exponent, 0.5 <= mantissa < 1
+        if value <= 0 or exponent <= self.MIN_EXP:
+            index = 0
+        elif exponent > self.MAX_EXP:
+            index = len(self.counts) - 1
+        else:
+            index = (exponent - self.MIN_EXP - 1) * self.SUB + int((mantissa - 0.5) * 2 * self.SUB) + 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, index):
+        """第index个桶的上界(s)"""
+        if index == 0:
+            return 2.0 ** self.MIN_EXP
+        exponent, sub = divmod(index - 1, self.SUB)
+        return 2.0 ** (exponent + self.MIN_EXP) * (1 + (sub + 1) / self.SUB)
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p):
+        """返回第p百分位所在桶的上界(s)，不超过记录到的最大值"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        rank = total * p / 100
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def summary(self):
+        """次数、平均、p50/p95/p99、最大(ms)"""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count * 1000 if self.count else 0.0,
+            'p50': self.percentile(50) * 1000,
+            'p95': self.percentile(95) * 1000,
+            'p99': self.percentile(99) * 1000,
+            'max': self.max * 1000
+        }
+
+
+class ReadStats:
+    """一个读取来源（读取计划或逐点读取的节点）的统计，由执行读取的线程单独写入"""
+    def __init__(self):
+        self.reads = 0
+        self.errors = 0
+        self.bytes = 0
+        self.first = None   #首次/最近一次成功读取的单调时钟时刻
+        self.last = None
+        self.latency = LatencyHistogram()
+
+    def record(self, latency, size):
+        self.last = time.monotonic()
+        if self.first == None:
+            self.first = self.last
+        self.reads += 1
+        self.bytes += size
+        self.latency.record(latency)
+
+    def error(self):
+        self.errors += 1
+
+    def rate(self):
+        """实际读取频率(Hz)"""
+        if self.reads < 2 or self.last == self.first:
+            return 0.0
+        return (self.reads - 1) / (self.last - self.first)
+
+    def elapsed(self):
+        return self.last - self.first if self.reads >= 2 else 0.0
@@ -0,0 +1,231 @@
+import threading
+from utils.statepoint import StatepointBase, CompactStatepoint, default_converter
+from utils.timerwheel import TimerWheel, get_timer_wheel
+"""顺序状态编译器：用数据描述N步检测序列，生成一个在输入事件中同步求值的状态对象"""
+
+class SequenceInput:
+    """序列的输入端，作为make_point的点类型接收数据源推送，直接交给所属序列同步处理"""
+    __slots__ = ('sequence', 'index')
+
+    def __init__(self, sequence, index):
+        self.sequence = sequence
+        self.index = index
+
+    def inject(self, data):
+        self.sequence.feed(self.index, data)
+
+    def inject_at(self, data, timestamp):
+        self.sequence.feed(self.index, data)
+
+    def mark_gap(self, start, end = None):
+        pass
+
+
+class SequenceStep:
+    """序列中的一步
+    converter：输入数据 -> 是否触发
+    keep_time：输入由触发变为未触发后需保持的时间(ms)，期间恢复则视为抖动
+    timeout：上一步触发后等待本步触发的最长时间(s)，超时则放弃本次序列，None表示不限时
+    """
+    __slots__ = ('name', 'converter', 'keep_time', 'timeout', 'active', 'raw', 'armed', 'debounce')
+
+    def __init__(self, name = '', converter = default_converter, keep_time = 0, timeout = None):
+        self.name = name
+        self.converter = converter
+        self.keep_time = keep_time
+        self.timeout = timeout
+        self.active = False     #去抖后的状态
+        self.raw = False        #最近一次输入的状态
+        self.armed = False      #是否接受输入，同Statepoint.allow_update；未接受期间active保持不变
+        self.debounce = None
+
+
+class Sequence(CompactStatepoint):
+    """N步顺序检测，逐步开放的规则同Through_state_*：第一步始终接受输入，某步触发后开放下一步并按其当前输入重新评估，
+    某步复位时若下一步未触发则关闭下一步；最后一步触发时序列输出变为True并执行excite。
+    reset='all'（同Through_state_continues3）：某步复位时若其前一步未触发（第一步为其后所有步均未触发），输出变为False并执行reset，
+    之后关闭除第一步外的各步、最后一步置为未触发，第一步仍处于触发状态时重新开放第二步；
+    reset='last'（同Through_state_separation2）：最后一步复位时输出变为False并执行reset，之后所有步置为未触发，
+    再从第一步起按当前输入重新评估，仍处于触发状态的步依次视为已到达。
+    序列完成前除第一步外的步全部被关闭且第一步未触发、或等待下一步超时，则放弃本次序列并执行abort回调。
+    所有判断在输入事件的线程中同步完成，去抖与超时由共享时间轮驱动，不为每一步创建线程。
+    """
+    __slots__ = ('steps', 'reset_mode', 'fired', 'timeout', 'wheel', 'seq_lock', 'do_abort', 'counts')
+
+    def __init__(self, steps: list, reset = 'all', wheel: TimerWheel | None = None):
+        super().__init__(False, False)
+        if reset not in ('all', 'last'):
+            raise ValueError(f'不支持的复位方式：{reset}')
+        if not steps:
+            raise ValueError('序列至少需要一步')
+        self.steps = steps
+        self.reset_mode = reset
+        self.fired = False
+        self.timeout = None     #等待下一步的超时任务
+        self.wheel = wheel
+        self.seq_lock = threading.RLock()
+        self.do_abort = None
+        self.counts = {'started': 0, 'completed': 0, 'aborted': 0, 'timeouts': 0}
+        steps[0].armed = True
+
+    def get_wheel(self):
+        if self.wheel != None:
+            return self.wheel
+        if StatepointBase.default_timer_wheel != None:
+            return StatepointBase.default_timer_wheel
+        return get_timer_wheel()
+
+    def input(self, index):
+        """第index步的输入端"""
+        return SequenceInput(self, index)
+
+    def input_type(self, index):
+        """用作make_point的point_type，数据源创建的点直接驱动第index步"""
+        return lambda *args: SequenceInput(self, index)
+
+    def set_abort_action(self, func):
+        if callable(func):
+            self.do_abort = func
+        else:
+            raise TypeError('The parameter func can only be a function')
+
+    def feed(self, index, data):
+        """第index步收到新数据"""
+        step = self.steps[index]
+        with self.seq_lock:
+            raw = bool(step.converter(data))
+            if raw == step.raw:
+                return None
+            step.raw = raw
+            if raw and step.debounce != None:#复位保持期间恢复，视为抖动；同Statepoint，即使该步已被关闭也重新评估
+                step.debounce.cancel()
+                step.debounce = None
+                self.evaluate(index)
+            elif step.armed:
+                self.evaluate(index)
+
+    def evaluate(self, index):
+        """按第index步的当前输入更新其状态，需持有seq_lock"""
+        step = self.steps[index]
+        if step.raw and not step.active:
+            step.active = True
+            self.on_rise(index)
+        elif not step.raw and step.active and step.debounce == None:
+            if step.keep_time > 0:
+                step.debounce = self.get_wheel().schedule(step.keep_time / 1000, lambda: self.confirm_fall(index))
+            else:
+                step.active = False
+                self.on_fall(index)
+
+    def confirm_fall(self, index):
+        step = self.steps[index]
+        with self.seq_lock:
+            if step.debounce == None:#已被取消
+                return None
+            step.debounce = None
+            step.active = False
+            self.on_fall(index)
+
+    def arm(self, index):
+        step = self.steps[index]
+        step.armed = True
+        self.evaluate(index)
+        if not step.active and step.timeout != None and not self.fired:
+            if self.timeout != None:
+                self.timeout.cancel()
+            self.timeout = self.get_wheel().schedule(step.timeout, lambda: self.expire(index))
+
+    def disarm(self, index):
+        self.steps[index].armed = False
+        if self.timeout != None:
+            self.timeout.cancel()
+            self.timeout = None
+
+    def on_rise(self, index):
+        if self.timeout != None:
+            self.timeout.cancel()
+            self.timeout = None
+        if index == len(self.steps) - 1:
+            if not self.fired:
+                self.fired = True
+                self.counts['completed'] += 1
+                self.state = True
+                self.excite()
+            return None
+        if index == 0 and not self.fired:
+            self.counts['started'] += 1
+        self.arm(index + 1)
+
+    def on_fall(self, index):
+        steps = self.steps
+        closed = index < len(steps) - 1 and steps[index + 1].armed and not steps[index + 1].active
+        if closed:
+            self.disarm(index + 1)
+        if self.reset_mode == 'last':
+            drop = index == len(steps) - 1
+        elif index == 0:
+            drop = not any(step.active for step in steps[1:])
+        else:
+            drop = not steps[index - 1].active
+        if drop and self.fired:
+            self.fired = False
+            self.state = False
+            self.reset()
+            self.restart()
+        elif closed and not self.fired and not steps[0].active and not any(step.armed for step in steps[1:]):
+            self.abort()
+
+    def expire(self, index):
+        with self.seq_lock:
+            if self.fired or not self.steps[index].armed or self.steps[index].active:
+                return None
+            self.timeout = None
+            self.counts['timeouts'] += 1
+            for i in range(1, len(self.steps)):
+                self.disarm(i)
+            self.abort()
+
+    def abort(self):
+        self.counts['aborted'] += 1
+        if self.do_abort:
+            self.do_abort()
+
+    def restart(self):
+        """输出复位后重新开始：关闭后续各步，再从第一步起按当前输入逐步评估，已处于触发状态的步依次视为已到达"""
+        steps = self.steps
+        for i in range(1, len(steps)):
+            self.disarm(i)
+        if self.reset_mode == 'last':
+            for step in steps:
+                step.active = False
+            self.evaluate(0)
+        else:
+            steps[-1].active = False
+            if steps[0].active:
+                self.on_rise(0)
+
+    def get_stats(self):
+        with self.seq_lock:
+            stage = len(self.steps) if self.fired else max(i for i, step in enumerate(self.steps) if step.armed)
+            return dict(self.counts, stage=stage, fired=self.fired)
+
+
+def compile_sequence(spec: dict, wheel: TimerWheel | None = None):
+    """按描述生成Sequence
+    spec = {
+        'reset': 'all' | 'last',
+        'steps': [
+            {'source': 数据源(S7data/CIPData等), 'name': 点名称, 'converter': 函数, 'keep_time': ms, 'timeout': s},
+            ...
+        ]
+    }
+    给出source与name的步会通过source.make_point创建输入端；未给出的步可用sequence.input(i)或feed手动输入
+    """
+    steps = []
+    for i in spec['steps']:
+        steps.append(SequenceStep(i.get('name', ''), i.get('converter') or default_converter, i.get('keep_time', 0), i.get('timeout')))
+    sequence = Sequence(steps, spec.get('reset', 'all'), wheel)
+    for index, i in enumerate(spec['steps']):
+        if i.get('source') != None:
+            i['source'].make_point(i['name'], sequence.input_type(index))
+    return sequence
@@ -1,20 +1,70 @@
 import threading, time
+from utils.dispatcher import Dispatcher
+from utils.timerwheel import TimerWheel, get_timer_wheel
+
+def default_converter(data):
+    return bool(data)
+
+def do_nothing():
+    return None
+
+lock_guard = threading.Lock()   #保护各点锁的延迟创建
+
+def point_time():
+    """状态点逻辑使用的当前时间戳(s)，回放时为虚拟时钟"""
+    return StatepointBase.default_clock()
+
+def call_later(delay, func, *args):
+    """delay(s)后执行耗时任务：设置了default_timer_wheel（如回放时的虚拟时间轮）时由其驱动，否则使用独立的定时器线程"""
+    wheel = StatepointBase.default_timer_wheel
+    if wheel != None:
+        return wheel.schedule(delay, lambda: func(*args))
+    timer = threading.Timer(delay, func, args=args)
+    timer.start()
+    return timer
+
+class StatepointBase:
+    """状态点的全部逻辑，属性以__slots__声明；Statepoint与CompactStatepoint均由此派生"""
+    __slots__ = ('data', 'state', 'hmd', '_lock', 'permitted_update', '__private_permitted_update',
+                 'converter', 'do_excite', 'do_reset', 'keep_time', 'pre_reset', 'dispatcher', 'timer_wheel', '__debounce')
+    default_dispatcher = None   #进程级共享调度器，为None时每次状态更新新建线程
+    default_timer_wheel = None  #keep_time防抖使用的时间轮，为None时使用进程级共享时间轮
+    default_clock = time.time   #point_time使用的时钟
+    transition_hook = None      #hook(point, 'excite' | 'reset')，每次执行excite/reset前调用，用于回放记录
 
-class Statepoint:
     def __init__(self, initvalue = False, initstate = False):
         self.data = initvalue
         self.state = initstate
-        self.hmd = set()
-        self.lock = threading.Lock()
+        self.hmd = None         #黑名单在第一次hmd_add时创建
+        self._lock = None       #锁在第一次状态更新时创建
         self.permitted_update = True
         self.__private_permitted_update = True
-        self.converter = lambda data: bool(data)
-        self.do_excite = lambda: None
-        self.do_reset = lambda: None
+        self.converter = default_converter
+        self.do_excite = do_nothing
+        self.do_reset = do_nothing
         self.keep_time = 1000
         self.pre_reset = False
+        self.dispatcher = None  #单点指定的调度器，优先于default_dispatcher
+        self.timer_wheel = None
+        self.__debounce = None  #等待复位的防抖定时任务
+
+    @property
+    def lock(self):
+        lock = self._lock
+        if lock == None:
+            with lock_guard:
+                if self._lock == None:
+                    self._lock = threading.Lock()
+                lock = self._lock
+        return lock
+
+    @lock.setter
+    def lock(self, lock):
+        self._lock = lock
 
     def hmd_add(self, data):
+        if self.hmd == None:
+            self.hmd = set()
         self.hmd.add(data)
 
     def inject(self, data):
@@ -26,18 +76,35 @@ class Statepoint:
         if self.permitted_update and self.__private_permitted_update:
             self.__async_update_state()
             #self.__update_state()
+        elif self.__debounce != None and self.converter(data):#防抖期间数据恢复，取消待执行的复位
+            debounce = self.__debounce
+            if debounce.cancel():
+                self.__debounce = None
+                self.__private_allow_update()
+
+    def inject_at(self, data, timestamp):
+        """带采集时刻的注入，timestamp为读取时刻的时间戳(s)；不关心时间的点直接按inject处理"""
+        self.inject(data)
+
+    def mark_gap(self, start, end = None):
+        """数据源中断时标记缺口[start, end]，end为None表示中断尚未结束；不缓存历史的点忽略"""
+        pass
 
     def excite(self):
         #logger.info('excite to next')
+        if StatepointBase.transition_hook != None:
+            StatepointBase.transition_hook(self, 'excite')
         self.do_excite()
 
     def reset(self):
+        if StatepointBase.transition_hook != None:
+            StatepointBase.transition_hook(self, 'reset')
         self.do_reset()
 
-    def __update_state(self):
+    def __update_state(self, data):
         with self.lock:
             last_state = self.state
-            self.state = self.converter(self.data)
+            self.state = self.converter(data)
             if last_state == False and self.state == True:
                 self.pre_reset = False
                 self.excite()
@@ -51,15 +118,40 @@ class Statepoint:
                     self.state = True
                     self.__private_allow_update(False)
                     self.pre_reset = True
-                    timer = threading.Timer(self.keep_time/1000, lambda: self.__private_allow_update())
-                    timer.start()
+                    wheel = self.timer_wheel if self.timer_wheel != None else StatepointBase.default_timer_wheel
+                    if wheel == None:
+                        wheel = get_timer_wheel()
+                    self.__debounce = wheel.schedule(self.keep_time/1000, self.__end_debounce)
             elif last_state == True and self.state == True:
                 self.pre_reset = False
             else:
                 self.pre_reset = False
 
+    def __end_debounce(self):
+        self.__debounce = None
+        self.__private_allow_update()
+
     def __async_update_state(self):
-        threading.Thread(target=self.__update_state).start()
+        dispatcher = self.dispatcher if self.dispatcher != None else StatepointBase.default_dispatcher
+        if dispatcher == None:#各线程之间没有先后顺序，在线程中读取最新的数据，避免较早的线程最后完成时以旧数据计算状态
+            threading.Thread(target=lambda: self.__update_state(self.data)).start()
+        else:#同一个点的状态更新在调度器中按提交顺序串行执行，每次更新使用提交时的数据
+            dispatcher.submit(self, lambda data=self.data: self.__update_state(data))
+
+    @staticmethod
+    def set_default_dispatcher(dispatcher: Dispatcher | None):
+        """设置进程级共享调度器，之后所有未单独指定调度器的点都通过它更新状态"""
+        if dispatcher != None:
+            dispatcher.start()
+        StatepointBase.default_dispatcher = dispatcher
+
+    def set_dispatcher(self, dispatcher: Dispatcher | None):
+        if dispatcher != None:
+            dispatcher.start()
+        self.dispatcher = dispatcher
+
+    def set_timer_wheel(self, wheel: TimerWheel | None):
+        self.timer_wheel = wheel
 
     def allow_update(self, enable: bool = True):
         self.permitted_update = enable
@@ -73,19 +165,19 @@ class Statepoint:
             self.__async_update_state()
             #self.__update_state()
 
-    def set_convertor(self, func = lambda data: bool(data)):
+    def set_convertor(self, func = default_converter):
         if callable(func):
             self.converter = func
         else:
             raise TypeError('The parameter func can only be a function')
 
-    def set_excite_action(self, func = lambda: None):
+    def set_excite_action(self, func = do_nothing):
         if callable(func):
             self.do_excite = func
         else:
             raise TypeError('The parameter func can only be a function')
 
-    def set_reset_action(self, func = lambda: None):
+    def set_reset_action(self, func = do_nothing):
         if callable(func):
             self.do_reset = func
         else:
@@ -97,6 +189,17 @@ class Statepoint:
     def set_state(self, state):
         self.state = state
 
+class Statepoint(StatepointBase):
+    """常规状态点：实例带__dict__，可自由添加属性，黑名单与锁在创建时分配"""
+    def __init__(self, initvalue = False, initstate = False):
+        super().__init__(initvalue, initstate)
+        self.hmd = set()
+        self._lock = threading.Lock()
+
+class CompactStatepoint(StatepointBase):
+    """紧凑状态点：无__dict__，默认回调共享，黑名单与锁延迟分配，用于大量派生点，接口与Statepoint一致"""
+    __slots__ = ()
+
 class Through_state_continues3(Statepoint):
     def __init__(self, p1, p2, p3):
         super().__init__()
@@ -180,12 +283,16 @@ class Through_state_separation2(Statepoint):
 class Integration_speed_mpmin(Statepoint):
     def __init__(self, *args):
         super().__init__(*args)
-        self.last_inject_time = time.time()
+        self.last_inject_time = point_time()
         self.last_data = 0
         self.last_data_time = self.last_inject_time
 
     def inject(self, data):
-        current_inject_time = time.time()
+        return self.inject_at(data, point_time())
+
+    def inject_at(self, data, timestamp):
+        """按读取时刻积分，回放时结果与实时运行一致"""
+        current_inject_time = timestamp
         current_data = data
         current_data_time = self.last_inject_time + (current_inject_time - self.last_inject_time) / 2
 
@@ -0,0 +1,149 @@
+import threading, time, math, warnings
+
+class Timeout:
+    """TimerWheel.schedule返回的定时任务句柄"""
+    def __init__(self, wheel, tick, seq, func):
+        self.wheel = wheel
+        self.tick = tick
+        self.seq = seq
+        self.func = func
+        self.cancelled = False
+        self.fired = False
+
+    def cancel(self):
+        """取消尚未执行的任务，返回是否取消成功"""
+        return self.wheel.cancel(self)
+
+
+class TimerWheel:
+    """哈希时间轮：单线程驱动所有延时任务，加入与取消均为O(1)
+    时间按tick(s)分格，任务放入(到期格数 % slots)对应的槽，线程每格检查一个槽并执行到期任务。
+    到期时刻以启动时的时钟为基准按格计算，不随负载漂移；任务只会晚于、不会早于设定时间执行，误差不超过一格。
+    任务在时间轮线程中执行，应尽快返回，耗时操作请转交其他线程。
+    clock可替换为虚拟时钟，此时不启动线程，由调用方通过advance推进时间。
+    """
+    def __init__(self, tick = 0.01, slots = 512, clock = time.monotonic, logger = None):
+        self.tick = tick
+        self.slots = [{} for i in range(slots)]    #每个槽：Timeout -> None，字典保持加入顺序并支持O(1)删除
+        self.clock = clock
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.origin = clock()
+        self.current = 0    #下一个待检查的格
+        self.seq = 0
+        self.count = 0      #尚未执行的任务数
+        self.thread = None
+        self.thread_run = False
+        self.wakeup = threading.Event()
+
+    def schedule(self, delay, func):
+        """delay(s)后执行func，返回Timeout句柄"""
+        with self.lock:
+            tick = max(self.current, math.ceil((self.clock() + delay - self.origin) / self.tick))
+            self.seq += 1
+            handle = Timeout(self, tick, self.seq, func)
+            self.slots[tick % len(self.slots)][handle] = None
+            self.count += 1
+        self.wakeup.set()
+        return handle
+
+    def cancel(self, handle: Timeout):
+        with self.lock:
+            if handle.cancelled or handle.fired:
+                return False
+            handle.cancelled = True
+            del self.slots[handle.tick % len(self.slots)][handle]
+            self.count -= 1
+            return True
+
+    def advance(self, now = None):
+        """执行截止到now(默认当前时钟)的全部到期任务，按到期时刻与加入顺序执行，返回执行的任务数"""
+        if now == None:
+            now = self.clock()
+        target = math.floor((now - self.origin) / self.tick)
+        fired = []
+        with self.lock:
+            if target < self.current:
+                return 0
+            if self.count == 0:
+                self.current = target + 1
+                return 0
+            if target - self.current >= len(self.slots):#跨越超过一圈，整体扫描一次
+                for slot in self.slots:
+                    due = [handle for handle in slot if handle.tick <= target]
+                    for handle in due:
+                        del slot[handle]
+                    fired.extend(due)
+                fired.sort(key=lambda handle: (handle.tick, handle.seq))
+            else:
+                while self.current <= target:
+                    slot = self.slots[self.current % len(self.slots)]
+                    if slot:
+                        due = [handle for handle in slot if handle.tick <= self.current]
+                        for handle in due:
+                            del slot[handle]
+                        fired.extend(due)
+                    self.current += 1
+            self.current = target + 1
+            self.count -= len(fired)
+            for handle in fired:
+                handle.fired = True
+
+        for handle in fired:
+            try:
+                handle.func()
+            except Exception as reason:
+                warnings.warn(f'定时任务异常：{reason}')
+                if self.logger:
+                    self.logger.error(f'定时任务异常：{reason}')
+        return len(fired)
+
+    def next_deadline(self):
+        """最早一个未执行任务的到期时刻(按时钟计)，没有任务返回None；需扫描全部槽，供虚拟时钟逐个推进使用"""
+        with self.lock:
+            if self.count == 0:
+                return None
+            tick = min(handle.tick for slot in self.slots for handle in slot)
+            return self.origin + tick * self.tick
+
+    def run(self):
+        while self.thread_run:
+            self.wakeup.clear()
+            if self.count == 0:#没有任务时挂起，直到有新任务加入
+                self.wakeup.wait()
+                continue
+            delay = self.origin + self.current * self.tick - self.clock()
+            if delay > 0:
+                time.sleep(delay)
+            self.advance()
+
+    def start(self):
+        if self.thread:
+            return None
+        self.thread_run = True
+        self.thread = threading.Thread(target=self.run, daemon=True, name='timer-wheel')
+        self.thread.start()
+
+    def stop(self):
+        self.thread_run = False
+        self.wakeup.set()
+        if self.thread == None:
+            return None
+        self.thread.join()
+        self.thread = None
+
+    def __len__(self):
+        return self.count
+
+
+default_wheel = None
+default_lock = threading.Lock()
+
+def get_timer_wheel():
+    """进程级共享的时间轮，首次使用时创建并启动"""
+    global default_wheel
+    with default_lock:
+        if default_wheel == None:
+            default_wheel = TimerWheel()
+            default_wheel.start()
+        return default_wheel